@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import logging
+import threading
+import multiprocessing
+import numpy
+from rtrade_engine import TradeEngine
+from trade_store import TradeStore
+from structured_log import setup_logging
+from position_board import PositionBoard, STARTING, CONNECTED, FAILED
+
+# 多帳戶反向跟單：協調進程每輪只讀取一次工作表，把目標手數分發給每個帳戶的工作進程並行執行
+# MetaTrader5 套件每個進程只能綁定一個終端，因此每個帳戶固定一個常駐進程，而不是共用的進程池
+# 協調進程與工作進程經由每個帳戶一塊的共享記憶體看板 (position_board.py) 交換目標及淨持倉，
+# 看板以工作表產品名稱為鍵，各帳戶可使用不同的券商品種名稱；
+# 工作表讀取與下單不在同一進程，慢的 Sheets 請求不會阻塞下單
+# 帳戶設定檔: [{"name": "A", "path": "C:/MT5-A/terminal64.exe", "login": 123, "password": "...", "server": "...",
+#               "symbols": {"xauusd": "XAUUSD.ECN"}}]，symbols 省略時使用協調進程的產品對照表
+
+TERMINAL_KEYS = ("path", "login", "password", "server", "timeout", "portable")
+
+
+def load_accounts(path):
+    with open(path, encoding="utf-8") as f:
+        accounts = json.load(f)
+    names = [account.get("name") for account in accounts]
+    if not accounts or None in names or len(set(names)) != len(names):
+        raise ValueError("帳戶設定必須是非空列表，每個帳戶需要唯一的 name")
+    return accounts
+
+
+def account_log_path(log_file, name):
+    root, ext = os.path.splitext(log_file)
+    return f"{root}.{name}{ext or '.log'}"
+
+
+def account_store_path(store, name):
+    # 每個帳戶的成交及持倉記錄在記錄目錄下的獨立子目錄，目標手數由協調進程記錄在記錄目錄本身
+    return os.path.join(store, "accounts", name)
+
+
+def account_worker(account, keys, board_name, wake, done, symbol_map, settings):
+    # 工作進程：連接自己的終端，看板出現新批次目標時對帳並下單，把淨持倉、成交數及耗時寫回看板；
+    # 每 health_interval 秒檢查終端連線，中斷時把狀態設為 FAILED 並退出，由協調進程的連線監控重啟
+    name = account["name"]
+    if settings.get("log_file"):
+        setup_logging(account_log_path(settings["log_file"], name), level=settings.get("log_level", logging.INFO),
+                      console=False)
+    board = PositionBoard(keys, board_name, create=False, wake=wake, done=done)
+    engine = TradeEngine(symbol_map=account.get("symbols") or symbol_map)
+    untraded = [key for key in keys if key not in engine.symbols_by_google]
+    if untraded:
+        engine.log_message(f"警告: 帳戶 {name} 沒有設定產品 {', '.join(untraded)} 的品種，不會交易這些產品")
+    engine.terminal = {key: account[key] for key in TERMINAL_KEYS if key in account}
+    engine.retry_policy.deviation = settings.get("deviation", engine.retry_policy.deviation)
+    engine.retry_policy.max_attempts = settings.get("max_attempts", engine.retry_policy.max_attempts)
+    engine.retry_policy.latency_budget = settings.get("latency_budget", engine.retry_policy.latency_budget)
+    engine.trade_limiter.interval = settings.get("trade_interval", engine.trade_limiter.interval)
+    engine.trade_limiter.capacity = settings.get("trade_burst", engine.trade_limiter.capacity)
+    if settings.get("store"):
+        engine.store = TradeStore(account_store_path(settings["store"], name))
+
+    health_interval = settings.get("health_interval", 5.0)
+    batch = 0
+    sent_at = time.time()
+
+    def account_nets():
+        # 按看板鍵 (工作表產品名稱) 寫回淨持倉；本帳戶不交易的產品寫入 NaN，協調進程不檢查這些產品
+        return {key: engine.current_positions.get(engine.symbols_by_google[key].internal, 0.0)
+                if key in engine.symbols_by_google else numpy.nan for key in keys}
+
+    def report(started):
+        _, counters = engine.metrics.snapshot()
+        board.publish_nets(account_nets(), batch, counters.get("orders_filled", 0),
+                           counters.get("order_failures", 0), len(engine.trade_limiter.pending),
+                           started - sent_at, time.time() - started)
+
+    try:
+        if not engine.connect_to_mt5_and_fetch_positions():
+            board.set_field("state", FAILED)
+            done.set()
+            return
+        report(time.time())
+        board.set_field("state", CONNECTED)
+        done.set()
+
+        next_check = time.monotonic() + health_interval
+        while not board.field("stop"):
+            # 先清除再讀取，讀取期間寫入的新批次會再次設定 wake
+            if wake.wait(0.2):
+                wake.clear()
+            if board.field("stop"):
+                break
+            current, published_at, targets = board.read_targets()
+            if current != batch:
+                # 只讀取最新一批，中間被覆蓋的批次自然合併
+                batch, sent_at = current, published_at
+                started = time.time()
+                engine.cycle_started = time.perf_counter()
+                engine.google_positions = {engine.symbols_by_google[product].internal: lot
+                                           for product, lot in targets.items() if product in engine.symbols_by_google}
+                engine.update_mt5_positions()
+                engine.execute_trades()
+                report(started)
+            elif engine.trade_limiter.due():
+                # 被頻率限制排隊的交易到期時執行，並寫回新的持倉
+                started = time.time()
+                engine.run_due_checks()
+                report(started)
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + health_interval
+                if not engine.check_mt5():
+                    engine.log_message(f"錯誤: 帳戶 {name} MT5 終端連線中斷，工作進程退出")
+                    board.set_field("state", FAILED)
+                    done.set()
+                    return
+    finally:
+        engine.shutdown()
+        board.close()
+
+
+class FanoutEngine(TradeEngine):
+    # 協調進程沿用 TradeEngine 的工作表讀取、0 值確認、推送信號源及自適應刷新，
+    # 但不連接 MT5：持倉從看板讀取，execute_trades 改為把目標寫入所有帳戶的看板
+    def __init__(self, accounts, settings=None, connect_timeout=60.0, **kwargs):
+        super().__init__(**kwargs)
+        self.accounts = accounts
+        self.settings = settings or {}
+        self.connect_timeout = connect_timeout
+        self.context = multiprocessing.get_context("spawn")
+        self.done = self.context.Event()
+        self.boards = {}
+        self.processes = {}
+        self.dispatched = {}
+        self.reported = {}
+        self.watch_stop = threading.Event()
+        self.watch_thread = None
+
+    def connect_to_mt5_and_fetch_positions(self):
+        symbol_map = {spec.google: spec.mt5 for spec in self.symbols}
+        keys = [spec.google for spec in self.symbols]
+        for account in self.accounts:
+            name = account["name"]
+            board = PositionBoard(keys, wake=self.context.Event(), done=self.done)
+            process = self.context.Process(target=account_worker, name=f"rtrade-account-{name}",
+                                           args=(account, keys, board.name, board.wake, self.done, symbol_map,
+                                                 self.settings),
+                                           daemon=True)
+            process.start()
+            self.boards[name] = board
+            self.processes[name] = process
+
+        # 等待所有帳戶回報連線結果，連線失敗的帳戶不再分發目標
+        deadline = time.monotonic() + self.connect_timeout
+        waiting = set(self.boards)
+        while waiting and time.monotonic() < deadline:
+            self.done.wait(0.5)
+            self.done.clear()
+            for name in list(waiting):
+                state = self.boards[name].field("state")
+                if state == STARTING and self.processes[name].is_alive():
+                    continue
+                waiting.discard(name)
+                if state == CONNECTED:
+                    self.dispatched[name] = self.reported[name] = 0
+                    self.log_message(f"信息: 帳戶 {name} 已連接 MT5")
+                else:
+                    self.log_message(f"錯誤: 帳戶 {name} MT5 連線失敗，已停用")
+                    self.stop_account(name)
+        for name in waiting:
+            self.log_message(f"錯誤: 帳戶 {name} 在 {self.connect_timeout:.0f} 秒內未回報連線結果，已停用")
+            self.stop_account(name)
+
+        if not self.boards:
+            self.on_status("狀態: 所有帳戶 MT5 連線失敗")
+            return False
+        self.mt5_connected = True
+        self.watch_stop.clear()
+        self.watch_thread = threading.Thread(target=self.watch_reports, name="rtrade-fanout-reports", daemon=True)
+        self.watch_thread.start()
+        self.log_message(f"信息: 已連接 {len(self.boards)}/{len(self.accounts)} 個帳戶")
+        self.on_status("狀態: 已連接帳戶，等待 Google Sheets 連線")
+        self.on_mt5_connected()
+        return True
+
+    def stop_account(self, name):
+        board = self.boards.pop(name, None)
+        process = self.processes.pop(name, None)
+        if board is not None:
+            board.request_stop()
+        if process is not None:
+            process.join(5.0)
+            if process.is_alive():
+                process.terminate()
+        if board is not None:
+            board.close()
+        self.dispatched.pop(name, None)
+        self.reported.pop(name, None)
+
+    def watch_reports(self):
+        # 工作進程寫回看板後記錄耗時；持倉本身在需要時直接從看板讀取
+        while not self.watch_stop.is_set():
+            if not self.done.wait(0.5):
+                continue
+            self.done.clear()
+            for name, board in list(self.boards.items()):
+                acknowledged, filled, failed, queued, dispatch_delay, elapsed = board.read_report()
+                if acknowledged == self.reported.get(name) and not queued:
+                    continue
+                self.reported[name] = acknowledged
+                self.metrics.observe("account_dispatch", dispatch_delay)
+                self.metrics.observe("account_execute", elapsed)
+                self.log_message(f"信息: 帳戶 {name} 完成第 {acknowledged} 批目標，累計成交 {filled} 張、失敗 {failed} 張，"
+                                 f"分發 {dispatch_delay * 1e6:.0f} 微秒，執行 {elapsed * 1000:.1f} 毫秒，排隊 {queued} 個產品",
+                                 logging.DEBUG, account=name, latency_ms=round(elapsed * 1000, 1))
+
+    def account_positions(self):
+        # 返回 {帳戶: {內部產品名稱: 淨持倉}}，不包括帳戶不交易的產品 (NaN)
+        positions = {}
+        for name, board in list(self.boards.items()):
+            nets = board.read_nets()[1]
+            positions[name] = {spec.internal: nets[spec.google] for spec in self.symbols
+                               if nets[spec.google] == nets[spec.google]}
+        return positions
+
+    def check_mt5(self):
+        # 協調進程沒有終端，工作進程自行檢查終端連線並在中斷時回報 FAILED 後退出；
+        # 任何帳戶退出或回報中斷即視為中斷，重新連線時重啟所有帳戶
+        for name, process in list(self.processes.items()):
+            if self.boards[name].field("state") == FAILED:
+                self.log_message(f"錯誤: 帳戶 {name} 回報 MT5 終端連線中斷")
+                return False
+            if not process.is_alive():
+                self.log_message(f"錯誤: 帳戶 {name} 工作進程已退出 (代碼 {process.exitcode})")
+                return False
+        return bool(self.boards)
+
+    def reconnect_mt5(self):
+        self.watch_stop.set()
+        if self.watch_thread:
+            self.watch_thread.join(1.0)
+            self.watch_thread = None
+        for name in list(self.boards):
+            self.stop_account(name)
+        self.mt5_connected = False
+        return self.connect_to_mt5_and_fetch_positions()
+
+    def update_mt5_positions(self):
+        # 持倉由工作進程寫入看板，協調進程不讀取終端
+        pass
+
+    def positions_in_sync(self):
+        # 仍在執行上一批目標的帳戶視為同步，避免重複分發
+        for name, board in list(self.boards.items()):
+            acknowledged, positions = board.read_nets()
+            if acknowledged < self.dispatched.get(name, 0):
+                continue
+            for product, google_lot in self.google_positions.items():
+                net = positions.get(self.symbols_by_internal[product].google, 0.0)
+                # NaN 表示該帳戶不交易此產品
+                if net == net and abs(-google_lot - net) >= 0.01:
+                    return False
+        return True
+
+    def execute_trades(self, products=None):
+        if not self.google_positions and self.mt5_connected and self.zero_confirm.pending:
+            self.save_state()
+            return
+        if not self.google_positions or not self.mt5_connected:
+            self.log_message("警告: 未連接到帳戶或未找到交易數據")
+            self.save_state()
+            return
+        sent_at = time.time()
+        targets = {self.symbols_by_internal[product].google: lot for product, lot in self.google_positions.items()}
+        for name, board in list(self.boards.items()):
+            self.dispatched[name] = board.publish_targets(targets, sent_at)
+        self.log_message(f"信息: 目標已寫入 {len(self.boards)} 個帳戶看板", logging.DEBUG)
+        self.save_state()
+
+    def shutdown(self):
+        self.watch_stop.set()
+        if self.watch_thread:
+            self.watch_thread.join(1.0)
+            self.watch_thread = None
+        for name in list(self.boards):
+            self.stop_account(name)
+        self.mt5_connected = False
+        super().shutdown()
@@ -0,0 +1,200 @@
+import time
+import random
+from collections import namedtuple
+
+# 模擬 rtrade 使用到的 MetaTrader5 介面子集，可設定延遲及重報價比例，用於離線測試和基準測試
+
+TradePosition = namedtuple("TradePosition", ["ticket", "symbol", "type", "volume", "price_open", "time_msc"])
+Tick = namedtuple("Tick", ["bid", "ask", "time_msc"])
+OrderSendResult = namedtuple("OrderSendResult", ["retcode", "deal", "order", "volume", "price", "comment", "request"])
+AccountInfo = namedtuple("AccountInfo", ["login", "margin_mode", "fifo_close"])
+TerminalInfo = namedtuple("TerminalInfo", ["connected", "trade_allowed"])
+SymbolInfo = namedtuple("SymbolInfo", ["name", "volume_min", "volume_max", "volume_step", "filling_mode", "digits"])
+
+
+class FakeMT5:
+    ORDER_TYPE_BUY = 0
+    ORDER_TYPE_SELL = 1
+    TRADE_ACTION_DEAL = 1
+    TRADE_ACTION_CLOSE_BY = 10
+    ORDER_TIME_GTC = 0
+    ORDER_FILLING_FOK = 0
+    ORDER_FILLING_IOC = 1
+    ORDER_FILLING_RETURN = 2
+    SYMBOL_FILLING_FOK = 1
+    SYMBOL_FILLING_IOC = 2
+    TRADE_RETCODE_REQUOTE = 10004
+    TRADE_RETCODE_DONE = 10009
+    TRADE_RETCODE_INVALID_VOLUME = 10014
+    TRADE_RETCODE_PRICE_CHANGED = 10020
+    TRADE_RETCODE_PRICE_OFF = 10021
+    ACCOUNT_MARGIN_MODE_RETAIL_NETTING = 0
+    ACCOUNT_MARGIN_MODE_EXCHANGE = 1
+    ACCOUNT_MARGIN_MODE_RETAIL_HEDGING = 2
+
+    def __init__(self, **options):
+        self.configure(**options)
+
+    def configure(self, latency=0.0, order_latency=0.0, requote_rate=0.0, hedging=True, fifo=False,
+                  seed=1, connected=True, login=100001):
+        self.latency = latency
+        self.order_latency = order_latency
+        self.requote_rate = requote_rate
+        self.hedging = hedging
+        self.fifo = fifo
+        self.random = random.Random(seed)
+        self.connected = connected
+        self.login = login
+        self.tick_source = None
+        self.reset()
+
+    def reset(self):
+        self.positions = {}
+        self.prices = {}
+        self.next_ticket = 1
+        self.calls = {}
+        self.deals = []
+        self.error = (1, "Success")
+
+    def load_positions(self, rows):
+        # rows: [[ticket, symbol, type, volume, price_open, time_msc], ...]，用於重播時還原初始持倉
+        self.positions = {int(r[0]): TradePosition(int(r[0]), r[1], int(r[2]), float(r[3]), float(r[4]), int(r[5]))
+                          for r in rows}
+        self.next_ticket = max(self.positions, default=0) + 1
+
+    def _call(self, name, latency=None):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        delay = self.latency if latency is None else latency
+        if delay:
+            time.sleep(delay)
+
+    def _price(self, symbol):
+        # 每次讀取報價時隨機遊走
+        mid = self.prices.get(symbol, 100.0) + self.random.uniform(-0.05, 0.05)
+        self.prices[symbol] = mid
+        return mid
+
+    def initialize(self, *args, **kwargs):
+        self._call("initialize")
+        if not self.connected:
+            self.error = (-10003, "IPC initialize failed")
+        return self.connected
+
+    def shutdown(self):
+        self._call("shutdown")
+        return True
+
+    def last_error(self):
+        return self.error
+
+    def account_info(self):
+        self._call("account_info")
+        if not self.connected:
+            return None
+        mode = self.ACCOUNT_MARGIN_MODE_RETAIL_HEDGING if self.hedging else self.ACCOUNT_MARGIN_MODE_RETAIL_NETTING
+        return AccountInfo(self.login, mode, self.fifo)
+
+    def terminal_info(self):
+        self._call("terminal_info")
+        return TerminalInfo(True, True) if self.connected else None
+
+    def symbol_info(self, symbol):
+        self._call("symbol_info")
+        return SymbolInfo(symbol, 0.01, 100.0, 0.01, self.SYMBOL_FILLING_IOC | self.SYMBOL_FILLING_FOK, 2)
+
+    def symbol_info_tick(self, symbol):
+        self._call("symbol_info_tick")
+        if not self.connected:
+            return None
+        if self.tick_source:
+            quote = self.tick_source(symbol)
+            if quote:
+                self.prices[symbol] = (quote[0] + quote[1]) / 2
+                return Tick(quote[0], quote[1], int(time.time() * 1000))
+        mid = self._price(symbol)
+        return Tick(round(mid - 0.05, 2), round(mid + 0.05, 2), int(time.time() * 1000))
+
+    def positions_get(self, symbol=None, **kwargs):
+        self._call("positions_get")
+        if not self.connected:
+            return None
+        return tuple(p for p in self.positions.values() if symbol is None or p.symbol == symbol)
+
+    def _result(self, retcode, request, volume=0.0, price=0.0, comment=""):
+        deal = len(self.deals) + 1 if retcode == self.TRADE_RETCODE_DONE else 0
+        return OrderSendResult(retcode, deal, deal, volume, price, comment, request)
+
+    def _reduce(self, ticket, volume):
+        position = self.positions[ticket]
+        remaining = round(position.volume - volume, 8)
+        if remaining <= 1e-9:
+            del self.positions[ticket]
+        else:
+            self.positions[ticket] = position._replace(volume=remaining)
+
+    def order_send(self, request):
+        self._call("order_send", self.order_latency)
+        if not self.connected:
+            return None
+        symbol = request["symbol"]
+        volume = request["volume"]
+
+        if request["action"] == self.TRADE_ACTION_CLOSE_BY:
+            first, second = self.positions.get(request["position"]), self.positions.get(request["position_by"])
+            if first is None or second is None or first.type == second.type:
+                return self._result(self.TRADE_RETCODE_INVALID_VOLUME, request, comment="Invalid close by")
+            closed = min(first.volume, second.volume)
+            self._reduce(first.ticket, closed)
+            self._reduce(second.ticket, closed)
+            self.deals.append((symbol, "close_by", closed))
+            return self._result(self.TRADE_RETCODE_DONE, request, closed, 0.0, "Request executed")
+
+        if self.requote_rate and self.random.random() < self.requote_rate:
+            return self._result(self.TRADE_RETCODE_REQUOTE, request, price=round(self._price(symbol), 2), comment="Requote")
+
+        price = request.get("price", self._price(symbol))
+        ticket = request.get("position")
+        if ticket:
+            position = self.positions.get(ticket)
+            if position is None or volume > position.volume + 1e-9:
+                return self._result(self.TRADE_RETCODE_INVALID_VOLUME, request, comment="Invalid volume")
+            self._reduce(ticket, volume)
+        elif not self.hedging:
+            # 淨額帳戶：同一品種只保留一個持倉
+            existing = next((p for p in self.positions.values() if p.symbol == symbol), None)
+            signed = volume if request["type"] == self.ORDER_TYPE_BUY else -volume
+            if existing is not None:
+                net = round((existing.volume if existing.type == self.ORDER_TYPE_BUY else -existing.volume) + signed, 8)
+                del self.positions[existing.ticket]
+                if abs(net) > 1e-9:
+                    self._open(symbol, self.ORDER_TYPE_BUY if net > 0 else self.ORDER_TYPE_SELL, abs(net), price)
+            else:
+                self._open(symbol, request["type"], volume, price)
+        else:
+            self._open(symbol, request["type"], volume, price)
+        self.deals.append((symbol, request["type"], volume))
+        return self._result(self.TRADE_RETCODE_DONE, request, volume, price, "Request executed")
+
+    def _open(self, symbol, order_type, volume, price):
+        ticket = self.next_ticket
+        self.next_ticket += 1
+        self.positions[ticket] = TradePosition(ticket, symbol, order_type, volume, price, int(time.time() * 1000) + ticket)
+
+    def net_position(self, symbol):
+        return round(sum(p.volume if p.type == self.ORDER_TYPE_BUY else -p.volume
+                         for p in self.positions.values() if p.symbol == symbol), 8)
+
+
+def install(fake=None):
+    # 在匯入 rtrade_engine 之前呼叫，以模擬物件取代 MetaTrader5；未安裝 gspread/google-auth 時放入空的 sheets_client
+    import sys
+    import types
+    import importlib.util
+    fake = fake or FakeMT5()
+    sys.modules["MetaTrader5"] = fake
+    if "sheets_client" not in sys.modules and any(importlib.util.find_spec(name) is None
+                                                  for name in ("gspread", "google", "requests")):
+        module = types.ModuleType("sheets_client")
+        module.SheetsClient = None
+        sys.modules["sheets_client"] = module
+    return fake
@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_mt5 import install
+from bench.fake_sheets import FakeWorksheet, make_rows
+
+# 必須在匯入 rtrade_engine 之前以模擬物件取代 MetaTrader5
+FAKE_MT5 = install()
+
+from rtrade_engine import TradeEngine
+from metrics import percentile
+
+# 場景: (名稱, 品種數, 工作表行數, 重報價比例)
+SCENARIOS = [
+    ("1 品種 / 100 行", 1, 100, 0.0),
+    ("50 品種 / 100 行", 50, 100, 0.0),
+    ("1 品種 / 100k 行", 1, 100000, 0.0),
+    ("50 品種 / 100k 行", 50, 100000, 0.0),
+    ("50 品種 / 100 行 / 重報價 50%", 50, 100, 0.5),
+]
+
+
+def build_engine(symbol_count, row_count, requote_rate, sheet_latency, order_latency):
+    FAKE_MT5.configure(requote_rate=requote_rate, order_latency=order_latency, seed=7)
+    symbol_map = {f"sym{i:02d}": f"SYM{i:02d}.ECN" for i in range(symbol_count)}
+    worksheet = FakeWorksheet(make_rows(row_count, list(symbol_map)), latency=sheet_latency)
+    engine = TradeEngine(symbol_map=symbol_map)
+    engine.connect_to_mt5_and_fetch_positions()
+    engine.attach_worksheet(worksheet)
+    # 模擬工作表沒有 API 配額，避免刷新被配額預算延後
+    engine.sheet_quota.limit = 10 ** 9
+    # 每輪都修改手數，量度的是下單延遲而不是交易頻率限制
+    engine.trade_limiter.interval = 0.0
+    engine.mt5_connected = True
+    engine.auto_trade = True
+    return engine, worksheet
+
+
+def run_scenario(name, symbol_count, row_count, requote_rate, cycles, signals, sheet_latency, order_latency):
+    tracemalloc.start()
+    engine, worksheet = build_engine(symbol_count, row_count, requote_rate, sheet_latency, order_latency)
+
+    # 第一輪建立行索引並把持倉同步到目標
+    engine.refresh_data()
+
+    # 工作表不變時的刷新吞吐量
+    started = time.perf_counter()
+    for _ in range(cycles):
+        engine.refresh_data()
+    idle_elapsed = time.perf_counter() - started
+
+    # 每輪修改所有產品手數，量度由讀取工作表到成交的延遲
+    cycle_times = []
+    for i in range(signals):
+        lot = f"{(i % 5 + 1) * 0.5 * (-1 if i % 2 else 1):.2f}"
+        for spec in engine.symbols:
+            worksheet.set_lot(spec.google, lot)
+        started = time.perf_counter()
+        engine.refresh_data()
+        cycle_times.append(time.perf_counter() - started)
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies, counters = engine.metrics.snapshot()
+    fill = latencies.get("signal_to_fill", (0, 0.0, 0.0, 0.0))
+    cycle_times.sort()
+    return {
+        "name": name,
+        "idle_rate": cycles / idle_elapsed if idle_elapsed else 0.0,
+        "signal_p50": percentile(cycle_times, 0.50),
+        "signal_p95": percentile(cycle_times, 0.95),
+        "fill_p50": fill[1],
+        "fill_p95": fill[2],
+        "orders": counters.get("orders_filled", 0),
+        "failures": counters.get("order_failures", 0),
+        "requotes": counters.get("requotes", 0),
+        "full_scans": engine.sheet_index.full_scans,
+        "peak_mb": peak / (1024 * 1024),
+        "in_sync": engine.positions_in_sync(),
+    }
+
+
+def print_results(results):
+    header = f"{'場景':<28}{'空轉輪/秒':>10}{'信號p50ms':>11}{'信號p95ms':>11}{'成交p50ms':>11}{'成交p95ms':>11}" \
+             f"{'成交':>7}{'失敗':>6}{'重報價':>7}{'全表':>6}{'峰值MB':>9}{'同步':>6}"
+    print(header)
+    for r in results:
+        print(f"{r['name']:<28}{r['idle_rate']:>10.0f}{r['signal_p50'] * 1000:>11.2f}{r['signal_p95'] * 1000:>11.2f}"
+              f"{r['fill_p50'] * 1000:>11.2f}{r['fill_p95'] * 1000:>11.2f}{r['orders']:>7}{r['failures']:>6}"
+              f"{r['requotes']:>7}{r['full_scans']:>6}{r['peak_mb']:>9.2f}{'是' if r['in_sync'] else '否':>6}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="rtrade 離線基準測試 (模擬 MT5 及 Google Sheets)")
+    parser.add_argument("--cycles", type=int, default=200, help="工作表不變時的刷新輪數")
+    parser.add_argument("--signals", type=int, default=20, help="工作表變動 (產生訂單) 的刷新輪數")
+    parser.add_argument("--sheet-latency", type=float, default=0.0, help="每次工作表讀取的模擬延遲 (秒)")
+    parser.add_argument("--order-latency", type=float, default=0.0, help="每次 order_send 的模擬延遲 (秒)")
+    parser.add_argument("--scenario", action="append", help="只執行名稱包含此文字的場景，可重複")
+    parser.add_argument("--log-level", default="ERROR", help="引擎日誌級別，預設只顯示錯誤以免影響量度")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.ERROR))
+
+    results = []
+    for name, symbol_count, row_count, requote_rate in SCENARIOS:
+        if args.scenario and not any(s in name for s in args.scenario):
+            continue
+        results.append(run_scenario(name, symbol_count, row_count, requote_rate, args.cycles, args.signals,
+                                    args.sheet_latency, args.order_latency))
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
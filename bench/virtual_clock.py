@@ -0,0 +1,14 @@
+from datetime import datetime
+
+# 可手動推進的虛擬時鐘，代替 time.monotonic / datetime.now，用於重播及離線測試
+
+
+class VirtualClock:
+    def __init__(self, t=0.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+    def now(self):
+        return datetime.fromtimestamp(self.t)
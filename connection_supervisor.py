@@ -0,0 +1,127 @@
+import time
+
+# 連線狀態
+UP = "up"
+DOWN = "down"
+
+
+class LinkState:
+    # 單一連線的健康狀態及重新連線退避；首次連線成功前不監控 (由使用者或啟動流程負責首次連線)，
+    # 啟動時自動連線的連線 (auto_connect) 除外，首次連線失敗也按退避重試
+    def __init__(self, name, label):
+        self.name = name
+        self.label = label
+        self.state = None
+        self.down_since = None
+        self.attempts = 0
+        self.next_attempt = 0.0
+
+
+class ConnectionSupervisor:
+    # 定期檢查 MT5 (terminal_info / account_info) 及 Google Sheets (刷新連續失敗時以輕量中繼資料請求確認) 連線，
+    # 中斷時暫停刷新及交易，按指數退避自動重新連線，恢復後自動繼續；由 engine.run_due_checks 在引擎線程呼叫
+    def __init__(self, engine, interval=5.0, failure_threshold=2, initial_backoff=1.0, max_backoff=60.0,
+                 clock=time.monotonic, auto_connect=()):
+        self.engine = engine
+        self.interval = interval
+        self.failure_threshold = failure_threshold
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.next_check = 0.0
+        self.links = [LinkState("mt5", "MT5"), LinkState("sheets", "Google Sheets")]
+        self.auto_connect = set(auto_connect)
+        self.paused = False
+
+    def connected(self, link):
+        if link.name == "mt5":
+            return self.engine.mt5_connected
+        return self.engine.sheets_connected
+
+    def healthy(self, link):
+        if link.name == "mt5":
+            return self.engine.mt5_connected and self.engine.check_mt5()
+        if not self.engine.sheets_connected:
+            return False
+        # 正常刷新已證明連線可用，只在連續失敗時才額外發送請求
+        if self.engine.sheet_failures < self.failure_threshold:
+            return True
+        if self.engine.check_sheets():
+            self.engine.sheet_failures = 0
+            return True
+        return False
+
+    def reconnect(self, link):
+        if link.name == "mt5":
+            return self.engine.reconnect_mt5()
+        return self.engine.reconnect_sheets()
+
+    def tick(self):
+        now = self.clock()
+        down = [link for link in self.links if link.state == DOWN]
+        if now < self.next_check and not any(now >= link.next_attempt for link in down):
+            return
+        if now >= self.next_check:
+            self.next_check = now + self.interval
+            for link in self.links:
+                if link.state is None:
+                    # 首次連線成功後才開始監控；自動連線的連線首次失敗時立即進入重新連線
+                    if self.connected(link):
+                        link.state = UP
+                    elif link.name in self.auto_connect:
+                        self.mark_down(link, now, "首次連線失敗")
+                    continue
+                if link.state == UP and not self.healthy(link):
+                    self.mark_down(link, now)
+
+        for link in self.links:
+            if link.state == DOWN and now >= link.next_attempt:
+                self.attempt(link)
+        self.update_paused()
+
+    def mark_down(self, link, now, reason="連線中斷"):
+        link.state = DOWN
+        link.down_since = now
+        link.attempts = 0
+        link.next_attempt = now
+        # 中斷期間推送的目標也不會嘗試下單
+        if link.name == "mt5":
+            self.engine.mt5_connected = False
+        self.engine.metrics.increment(f"{link.name}_disconnects")
+        self.engine.log_message(f"錯誤: {link.label} {reason}，開始自動重新連線")
+
+    def attempt(self, link):
+        link.attempts += 1
+        started = self.clock()
+        try:
+            ok = self.reconnect(link)
+        except Exception as e:
+            self.engine.log_message(f"錯誤: {link.label} 重新連線出錯: {str(e)}")
+            ok = False
+        now = self.clock()
+        if ok:
+            downtime = now - link.down_since
+            self.engine.metrics.observe(f"{link.name}_reconnect", downtime)
+            self.engine.log_message(f"信息: {link.label} 已重新連線，中斷 {downtime:.1f} 秒，嘗試 {link.attempts} 次，"
+                                    f"本次連線耗時 {(now - started) * 1000:.0f} 毫秒")
+            link.state = UP
+            link.down_since = None
+            return
+        delay = min(self.max_backoff, self.initial_backoff * 2 ** (link.attempts - 1))
+        link.next_attempt = now + delay
+        self.engine.log_message(f"警告: {link.label} 第 {link.attempts} 次重新連線失敗，{delay:.0f} 秒後重試")
+
+    def update_paused(self):
+        paused = any(link.state == DOWN for link in self.links)
+        if paused == self.paused:
+            return
+        self.paused = paused
+        if paused:
+            self.engine.log_message("警告: 連線中斷，暫停自動刷新及交易")
+            self.engine.on_status("狀態: 連線中斷，正在重新連線")
+        else:
+            self.engine.log_message("信息: 所有連線已恢復，繼續自動刷新及交易")
+            if self.engine.sheets_connected:
+                self.engine.on_status("狀態: 已連接到 MT5 和 Google Sheets")
+            else:
+                self.engine.on_status("狀態: 已連接到 MT5，等待 Google Sheets 連線")
@@ -0,0 +1,88 @@
+from collections import namedtuple
+
+# kind: "close" 平倉指定持倉 (可部分平倉)，"close_by" 以反向持倉互相對沖平倉，"open" 開新倉
+# side: 1 為買入，-1 為賣出；close_by 時 ticket 為買單、by_ticket 為賣單
+PlannedOrder = namedtuple("PlannedOrder", ["kind", "side", "volume", "ticket", "by_ticket"])
+
+LOT_EPSILON = 1e-6
+
+
+def _round_lots(lots):
+    return round(lots + 0.0, 2)
+
+
+def _tickets(records, side, buy_type):
+    # 返回 [[ticket, volume], ...]，保持持倉簿中的開倉時間順序
+    is_buy = records["type"] == buy_type
+    chosen = records[is_buy] if side > 0 else records[~is_buy]
+    return [[int(r["ticket"]), float(r["volume"])] for r in chosen]
+
+
+def _close_order(tickets, amount, fifo):
+    # 先進先出帳戶必須按開倉時間平倉；否則優先平最大的持倉，以最少的單數完成
+    if not fifo:
+        tickets.sort(key=lambda t: -t[1])
+    orders = []
+    for ticket in tickets:
+        if amount <= LOT_EPSILON:
+            break
+        volume = min(ticket[1], amount)
+        orders.append((ticket[0], _round_lots(volume)))
+        ticket[1] -= volume
+        amount -= volume
+    return orders
+
+
+def plan_orders(records, target, hedging=True, fifo=False, buy_type=0):
+    # 根據持倉簿記錄及目標淨手數，計算最少的平倉、對沖平倉及開倉指令，結束時不保留鎖倉
+    if not hedging:
+        net = sum(float(r["volume"]) if r["type"] == buy_type else -float(r["volume"]) for r in records)
+        difference = _round_lots(target - net)
+        if abs(difference) < 0.01:
+            return []
+        return [PlannedOrder("open", 1 if difference > 0 else -1, abs(difference), None, None)]
+
+    longs = _tickets(records, 1, buy_type)
+    shorts = _tickets(records, -1, buy_type)
+    gross_long = sum(t[1] for t in longs)
+    gross_short = sum(t[1] for t in shorts)
+    if abs(target - (gross_long - gross_short)) < 0.01 and (gross_long < 0.01 or gross_short < 0.01):
+        return []
+
+    want_long = max(target, 0.0)
+    want_short = max(-target, 0.0)
+    reduce_long = max(gross_long - want_long, 0.0)
+    reduce_short = max(gross_short - want_short, 0.0)
+
+    orders = []
+    if not fifo:
+        # 兩邊都需要減倉時，以一次對沖平倉同時減少買單及賣單；
+        # 一張持倉在兩邊減倉額度仍有剩餘時繼續與其他反向持倉對沖
+        longs.sort(key=lambda t: -t[1])
+        shorts.sort(key=lambda t: -t[1])
+        for short in shorts:
+            for long in longs:
+                if reduce_long <= LOT_EPSILON or reduce_short <= LOT_EPSILON or short[1] <= LOT_EPSILON:
+                    break
+                if long[1] <= LOT_EPSILON:
+                    continue
+                volume = min(long[1], short[1])
+                if volume <= reduce_long + LOT_EPSILON and volume <= reduce_short + LOT_EPSILON:
+                    orders.append(PlannedOrder("close_by", 1, _round_lots(volume), long[0], short[0]))
+                    long[1] -= volume
+                    short[1] -= volume
+                    reduce_long -= volume
+                    reduce_short -= volume
+
+    for ticket, volume in _close_order([t for t in longs if t[1] > LOT_EPSILON], reduce_long, fifo):
+        orders.append(PlannedOrder("close", -1, volume, ticket, None))
+    for ticket, volume in _close_order([t for t in shorts if t[1] > LOT_EPSILON], reduce_short, fifo):
+        orders.append(PlannedOrder("close", 1, volume, ticket, None))
+
+    add_long = _round_lots(want_long - min(gross_long, want_long))
+    add_short = _round_lots(want_short - min(gross_short, want_short))
+    if add_long >= 0.01:
+        orders.append(PlannedOrder("open", 1, add_long, None, None))
+    elif add_short >= 0.01:
+        orders.append(PlannedOrder("open", -1, add_short, None, None))
+    return [order for order in orders if order.volume >= 0.01]
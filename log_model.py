@@ -0,0 +1,58 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer
+
+
+class LogTableModel(QAbstractTableModel):
+    # 固定容量的環形緩衝日誌模型，新日誌先暫存，定時批量加入，舊日誌自動移除
+    # 完整日誌仍由 logging 寫入磁碟
+    headers = ["時間", "日誌信息"]
+
+    def __init__(self, capacity=5000, flush_interval=200, parent=None):
+        super().__init__(parent)
+        self.capacity = capacity
+        self.buffer = [None] * capacity
+        self.start = 0
+        self.count = 0
+        self.pending = []
+        self.flush_timer = QTimer(self)
+        self.flush_timer.timeout.connect(self.flush)
+        self.flush_timer.start(flush_interval)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 2
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return self.buffer[(self.start + index.row()) % self.capacity][index.column()]
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return None
+
+    def append(self, current_time, message):
+        self.pending.append((current_time, message))
+
+    def flush(self):
+        # 返回本次加入的行數，供界面決定是否需要捲動到底部
+        if not self.pending:
+            return 0
+        rows = self.pending[-self.capacity:]
+        self.pending = []
+
+        overflow = self.count + len(rows) - self.capacity
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            self.start = (self.start + overflow) % self.capacity
+            self.count -= overflow
+            self.endRemoveRows()
+
+        self.beginInsertRows(QModelIndex(), self.count, self.count + len(rows) - 1)
+        for row in rows:
+            self.buffer[(self.start + self.count) % self.capacity] = row
+            self.count += 1
+        self.endInsertRows()
+        return len(rows)
@@ -0,0 +1,68 @@
+import math
+import time
+
+
+class MarketDataCache:
+    # 報價只保留很短時間，品種規格 (手數步長、上下限、成交模式) 長期快取，重新連線時清空
+    def __init__(self, mt5_api, tick_ttl=0.5, metrics=None):
+        self.mt5 = mt5_api
+        self.metrics = metrics
+        self.tick_ttl = tick_ttl
+        self.ticks = {}
+        self.specs = {}
+
+    def clear(self):
+        self.ticks = {}
+        self.specs = {}
+
+    def invalidate_ticks(self, symbol=None):
+        if symbol is None:
+            self.ticks = {}
+        else:
+            self.ticks.pop(symbol, None)
+
+    def tick(self, symbol):
+        cached = self.ticks.get(symbol)
+        now = time.monotonic()
+        if cached is not None and now - cached[1] < self.tick_ttl:
+            return cached[0]
+        started = time.perf_counter()
+        tick = self.mt5.symbol_info_tick(symbol)
+        if self.metrics:
+            self.metrics.observe("symbol_info_tick", time.perf_counter() - started)
+        if tick:
+            self.ticks[symbol] = (tick, now)
+        return tick
+
+    def symbol_info(self, symbol):
+        info = self.specs.get(symbol)
+        if info is None:
+            info = self.mt5.symbol_info(symbol)
+            if info:
+                self.specs[symbol] = info
+        return info
+
+    def filling_mode(self, symbol):
+        # symbol_info.filling_mode 是允許的成交模式位元組合，優先使用 IOC，其次 FOK
+        info = self.symbol_info(symbol)
+        if info is None:
+            return self.mt5.ORDER_FILLING_IOC
+        allowed = getattr(info, "filling_mode", 0)
+        if allowed & getattr(self.mt5, "SYMBOL_FILLING_IOC", 2):
+            return self.mt5.ORDER_FILLING_IOC
+        if allowed & getattr(self.mt5, "SYMBOL_FILLING_FOK", 1):
+            return self.mt5.ORDER_FILLING_FOK
+        return self.mt5.ORDER_FILLING_RETURN
+
+    def normalize_volume(self, symbol, lots):
+        # 按手數步長向下取整並限制在上下限之內，低於最小手數時返回 0
+        info = self.symbol_info(symbol)
+        if info is None:
+            return round(lots, 2)
+        step = info.volume_step or 0.01
+        volume = math.floor(lots / step + 1e-9) * step
+        volume = min(volume, info.volume_max)
+        if volume < info.volume_min:
+            return 0.0
+        digits = max(0, -int(math.floor(math.log10(step)))) if step < 1 else 0
+        return round(volume, digits)
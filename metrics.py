@@ -0,0 +1,113 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    position = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[position]
+
+
+class MetricsRegistry:
+    # 各階段耗時的滾動窗口 (計算 p50/p95/p99) 及計數器，可在多個線程中使用
+    def __init__(self, window=1024):
+        self.window = window
+        self.samples = {}
+        self.totals = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=self.window)
+                self.totals[stage] = [0, 0.0]
+            samples.append(seconds)
+            self.totals[stage][0] += 1
+            self.totals[stage][1] += seconds
+
+    def increment(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def snapshot(self):
+        # 返回 ({階段: (次數, p50, p95, p99)}, {計數器: 數值})，時間單位為秒
+        with self.lock:
+            stages = {stage: (sorted(samples), self.totals[stage][0]) for stage, samples in self.samples.items()}
+            counters = dict(self.counters)
+        latencies = {}
+        for stage, (values, count) in stages.items():
+            latencies[stage] = (count, percentile(values, 0.50), percentile(values, 0.95), percentile(values, 0.99))
+        return latencies, counters
+
+    def render_prometheus(self, prefix="rtrade"):
+        latencies, counters = self.snapshot()
+        with self.lock:
+            totals = {stage: tuple(total) for stage, total in self.totals.items()}
+        lines = [
+            f"# HELP {prefix}_stage_latency_seconds Rolling latency quantiles per pipeline stage.",
+            f"# TYPE {prefix}_stage_latency_seconds summary",
+        ]
+        for stage, (count, p50, p95, p99) in sorted(latencies.items()):
+            for quantile, value in (("0.5", p50), ("0.95", p95), ("0.99", p99)):
+                lines.append(f'{prefix}_stage_latency_seconds{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'{prefix}_stage_latency_seconds_sum{{stage="{stage}"}} {totals[stage][1]:.6f}')
+            lines.append(f'{prefix}_stage_latency_seconds_count{{stage="{stage}"}} {count}')
+        for counter, value in sorted(counters.items()):
+            lines.append(f"# TYPE {prefix}_{counter}_total counter")
+            lines.append(f"{prefix}_{counter}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # 先寫入暫存檔再替換，避免讀取方看到寫了一半的檔案
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(temp_path, path)
+
+    def start_http_server(self, port, host="127.0.0.1"):
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="rtrade-metrics", daemon=True).start()
+        return server
+
+    def start_file_writer(self, path, stop_event, interval=10.0):
+        # 在獨立線程定期寫入 Prometheus 檔案，檔案 I/O 不佔用界面或引擎線程；stop_event 設定後停止
+        def write_loop():
+            while not stop_event.wait(interval):
+                try:
+                    self.write_prometheus(path)
+                except OSError as e:
+                    logging.error(f"錯誤: 無法寫入性能指標檔案: {str(e)}")
+
+        thread = threading.Thread(target=write_loop, name="rtrade-metrics-file", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,127 @@
+import time
+from collections import deque
+from datetime import datetime
+
+# 刷新結果，由 TradeEngine.refresh_data 返回
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+THROTTLED = "throttled"
+DEFERRED = "deferred"
+FAILED = "failed"
+
+
+def rate_limit_delay(error):
+    # Google API 返回 429 時返回建議等待秒數 (沒有 Retry-After 時為 0)，其他錯誤返回 None
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) != 429:
+        return None
+    try:
+        return float(response.headers.get("Retry-After", 0))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+class QuotaTracker:
+    # 記錄最近一分鐘的 Sheets 讀取請求數，保持在預算之內；收到 429 後按指數退避暫停
+    # Google Sheets 預設每用戶每分鐘 60 次讀取，預算預設留出餘量
+    def __init__(self, limit=50, window=60.0, clock=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self.requests = deque()
+        self.throttled_until = float("-inf")
+        self.consecutive_throttles = 0
+        self.throttle_count = 0
+
+    def prune(self, now):
+        while self.requests and now - self.requests[0] >= self.window:
+            self.requests.popleft()
+
+    def record(self):
+        now = self.clock()
+        self.prune(now)
+        self.requests.append(now)
+
+    def used(self):
+        self.prune(self.clock())
+        return len(self.requests)
+
+    def wait_time(self):
+        # 返回距離可以再發送請求的秒數，0 表示可立即發送
+        now = self.clock()
+        if now < self.throttled_until:
+            return self.throttled_until - now
+        self.prune(now)
+        if len(self.requests) < self.limit:
+            return 0.0
+        return self.requests[0] + self.window - now
+
+    def min_spacing(self):
+        return self.window / self.limit if self.limit else 0.0
+
+    def throttle(self, retry_after=None):
+        self.consecutive_throttles += 1
+        self.throttle_count += 1
+        delay = retry_after or min(self.window, 5.0 * 2 ** (self.consecutive_throttles - 1))
+        self.throttled_until = self.clock() + delay
+        return delay
+
+    def clear_throttle(self):
+        self.consecutive_throttles = 0
+
+
+class AdaptivePoller:
+    # 偵測到變化後縮短到最短間隔，沒有變化時按倍數拉長；交易時段內間隔不超過 active_max_interval
+    # active_hours: [("08:00", "23:00"), ...]，只在週一至週五生效；None 表示不區分時段
+    def __init__(self, quota, min_interval=2.0, base_interval=10.0, max_interval=60.0, backoff=1.5,
+                 active_hours=None, active_max_interval=5.0, clock=time.monotonic, wall_clock=datetime.now):
+        self.quota = quota
+        self.min_interval = min_interval
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.active_hours = active_hours
+        self.active_max_interval = active_max_interval
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.interval = base_interval
+
+    def in_active_hours(self):
+        if not self.active_hours:
+            return False
+        now = self.wall_clock()
+        if now.weekday() >= 5:
+            return False
+        current = now.strftime("%H:%M")
+        return any(start <= current < end for start, end in self.active_hours)
+
+    def record_result(self, status):
+        if status == CHANGED:
+            self.interval = self.min_interval
+        elif status == THROTTLED:
+            # 等待時間由 QuotaTracker 的限流期決定，這裡只避免恢復後立即高頻讀取
+            self.interval = max(self.interval, self.base_interval)
+        elif status == DEFERRED:
+            return
+        else:
+            self.interval = min(max(self.interval, self.min_interval) * self.backoff, self.max_interval)
+        if status != THROTTLED:
+            self.quota.clear_throttle()
+
+    def next_interval(self):
+        interval = self.interval
+        if self.in_active_hours():
+            interval = min(interval, self.active_max_interval)
+        # 不低於配額允許的平均間隔，配額用盡或被限流時等到可以再請求
+        return max(interval, self.quota.min_spacing(), self.quota.wait_time())
+
+
+def parse_active_hours(text):
+    # "08:00-12:00,13:00-23:00" -> [("08:00", "12:00"), ("13:00", "23:00")]
+    if not text:
+        return None
+    hours = []
+    for part in text.split(","):
+        start, end = part.strip().split("-")
+        hours.append((start.strip().zfill(5), end.strip().zfill(5)))
+    return hours
@@ -0,0 +1,135 @@
+import time
+import numpy
+from multiprocessing import shared_memory
+
+# 信號讀取進程與下單進程之間的共享記憶體看板，每個帳戶一塊：
+# 讀取進程寫入目標手數 (target)，下單進程寫回淨持倉 (net) 及執行統計，雙方直接讀寫同一塊記憶體，不經序列化
+# 每一方只寫自己的欄位 (單一寫入者)，以 seqlock 保證讀取完整：寫入前後各把序號加 1，讀到奇數或前後不一致時重讀
+# 通知使用兩個 Event：wake 由讀取進程設定，叫醒下單進程；done 由下單進程設定，表示已回報
+
+HEADER_DTYPE = numpy.dtype([
+    ("target_seq", "u8"),       # 目標 seqlock 序號
+    ("batch", "u8"),            # 目標批次編號
+    ("sent_at", "f8"),          # 批次寫入時間 (time.time)
+    ("net_seq", "u8"),          # 淨持倉 seqlock 序號
+    ("acknowledged", "u8"),     # 下單進程已執行的批次編號
+    ("filled", "u8"),           # 累計成交訂單數
+    ("failed", "u8"),           # 累計失敗訂單數
+    ("queued", "u4"),           # 被頻率限制排隊的產品數
+    ("state", "i4"),            # 下單進程狀態，見下方常數
+    ("dispatch_delay", "f8"),   # 最近一批由寫入到開始執行的秒數
+    ("execute_time", "f8"),     # 最近一批執行耗時秒數
+    ("stop", "u1"),             # 讀取進程要求下單進程退出
+])
+ROW_DTYPE = numpy.dtype([
+    ("target", "f8"),           # NaN 表示沒有目標 (例如 0 值待確認)，下單進程不處理該產品
+    ("net", "f8"),
+])
+
+STARTING = 0
+CONNECTED = 1
+FAILED = -1
+
+
+class PositionBoard:
+    # keys 為內部產品名稱，讀取及下單進程必須使用相同順序；create=False 時按 name 連接已有看板
+    def __init__(self, keys, name=None, create=True, wake=None, done=None):
+        self.keys = list(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        size = HEADER_DTYPE.itemsize + ROW_DTYPE.itemsize * max(1, len(self.keys))
+        if create:
+            self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.memory.buf[:size] = bytes(size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.owner = create
+        self.header = numpy.ndarray(1, dtype=HEADER_DTYPE, buffer=self.memory.buf)
+        self.rows = numpy.ndarray(len(self.keys), dtype=ROW_DTYPE, buffer=self.memory.buf, offset=HEADER_DTYPE.itemsize)
+        if create:
+            self.rows["target"] = numpy.nan
+        self.wake = wake
+        self.done = done
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def field(self, name):
+        return self.header[name][0].item()
+
+    def set_field(self, name, value):
+        self.header[name] = value
+
+    def begin(self, seq_field):
+        self.header[seq_field] += 1
+
+    def end(self, seq_field):
+        self.header[seq_field] += 1
+
+    def read(self, seq_field, fields, columns):
+        # seqlock 讀取：序號為奇數 (寫入中) 或讀取前後不一致時重讀
+        while True:
+            seq = self.field(seq_field)
+            if seq & 1:
+                time.sleep(0)
+                continue
+            values = [self.field(field) for field in fields]
+            data = [self.rows[column].copy() for column in columns]
+            if self.field(seq_field) == seq:
+                return values, data
+
+    # 讀取進程使用
+    def publish_targets(self, targets, sent_at):
+        self.begin("target_seq")
+        column = numpy.full(len(self.keys), numpy.nan)
+        for key, lot in targets.items():
+            i = self.index.get(key)
+            if i is not None:
+                column[i] = lot
+        self.rows["target"] = column
+        self.header["sent_at"] = sent_at
+        self.header["batch"] += 1
+        self.end("target_seq")
+        if self.wake is not None:
+            self.wake.set()
+        return self.field("batch")
+
+    def read_nets(self):
+        (acknowledged,), (nets,) = self.read("net_seq", ("acknowledged",), ("net",))
+        return acknowledged, dict(zip(self.keys, nets.tolist()))
+
+    def read_report(self):
+        # 返回 (已執行批次, 累計成交, 累計失敗, 排隊產品數, 分發延遲, 執行耗時)
+        values, _ = self.read("net_seq", ("acknowledged", "filled", "failed", "queued", "dispatch_delay", "execute_time"), ())
+        return tuple(values)
+
+    def request_stop(self):
+        self.header["stop"] = 1
+        if self.wake is not None:
+            self.wake.set()
+
+    # 下單進程使用
+    def read_targets(self):
+        (batch, sent_at), (targets,) = self.read("target_seq", ("batch", "sent_at"), ("target",))
+        return batch, sent_at, {key: lot for key, lot in zip(self.keys, targets.tolist()) if lot == lot}
+
+    def publish_nets(self, positions, acknowledged, filled, failed, queued, dispatch_delay, execute_time):
+        self.begin("net_seq")
+        self.rows["net"] = [positions.get(key, 0.0) for key in self.keys]
+        self.header["acknowledged"] = acknowledged
+        self.header["filled"] = filled
+        self.header["failed"] = failed
+        self.header["queued"] = queued
+        self.header["dispatch_delay"] = dispatch_delay
+        self.header["execute_time"] = execute_time
+        self.end("net_seq")
+        if self.done is not None:
+            self.done.set()
+
+    def close(self):
+        # 先釋放 numpy 視圖，否則 SharedMemory.close 會因仍有緩衝區引用而失敗
+        self.header = None
+        self.rows = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
@@ -0,0 +1,62 @@
+import time
+import numpy
+
+POSITION_DTYPE = numpy.dtype([
+    ("ticket", "u8"),
+    ("symbol", "U32"),
+    ("type", "i1"),
+    ("volume", "f8"),
+    ("price_open", "f8"),
+    ("time_msc", "i8"),
+])
+
+EMPTY_POSITIONS = numpy.empty(0, dtype=POSITION_DTYPE)
+
+
+class PositionBook:
+    # 把 mt5.positions_get() 的結果轉成 NumPy 結構化陣列，一次分組計算每個品種的淨、多、空手數
+    def __init__(self, buy_type=0, clock=time.monotonic):
+        self.buy_type = buy_type
+        self.clock = clock
+        self.positions = EMPTY_POSITIONS
+        self.symbols = numpy.empty(0, dtype="U32")
+        self.net = numpy.empty(0)
+        self.gross_long = numpy.empty(0)
+        self.gross_short = numpy.empty(0)
+        self.symbol_index = {}
+        self.updated_at = float("-inf")
+
+    def update(self, positions):
+        if positions:
+            self.positions = numpy.array(
+                [(p.ticket, p.symbol, p.type, p.volume, p.price_open, getattr(p, "time_msc", 0)) for p in positions],
+                dtype=POSITION_DTYPE,
+            )
+        else:
+            self.positions = EMPTY_POSITIONS
+
+        self.symbols, inverse = numpy.unique(self.positions["symbol"], return_inverse=True)
+        is_buy = self.positions["type"] == self.buy_type
+        volume = self.positions["volume"]
+        count = len(self.symbols)
+        self.gross_long = numpy.bincount(inverse, weights=numpy.where(is_buy, volume, 0.0), minlength=count)
+        self.gross_short = numpy.bincount(inverse, weights=numpy.where(is_buy, 0.0, volume), minlength=count)
+        self.net = self.gross_long - self.gross_short
+        self.symbol_index = {str(symbol): i for i, symbol in enumerate(self.symbols)}
+        self.updated_at = self.clock()
+
+    def net_lots(self, symbol):
+        i = self.symbol_index.get(symbol)
+        return 0.0 if i is None else round(float(self.net[i]), 8)
+
+    def exposure(self, symbol):
+        # 返回 (淨手數, 多單總手數, 空單總手數)
+        i = self.symbol_index.get(symbol)
+        if i is None:
+            return 0.0, 0.0, 0.0
+        return round(float(self.net[i]), 8), float(self.gross_long[i]), float(self.gross_short[i])
+
+    def positions_for(self, symbol):
+        # 按開倉時間排序，方便先進先出平倉
+        records = self.positions[self.positions["symbol"] == symbol]
+        return records[numpy.argsort(records["time_msc"], kind="stable")]
@@ -0,0 +1,51 @@
+import time
+from collections import deque, namedtuple
+
+# 每張訂單的發送記錄：嘗試次數、總耗時 (秒) 及最後的回傳代碼
+OrderAttempt = namedtuple("OrderAttempt", ["symbol", "attempts", "elapsed", "retcode"])
+
+
+class RequotePolicy:
+    # 限制重報價重試次數和總耗時，每次重試前以最新報價重新定價
+    def __init__(self, mt5_api, max_attempts=5, latency_budget=2.0, deviation=20, history_size=500, metrics=None):
+        self.mt5 = mt5_api
+        self.metrics = metrics
+        self.max_attempts = max_attempts
+        self.latency_budget = latency_budget
+        self.deviation = deviation
+        self.history = deque(maxlen=history_size)
+
+    def retry_codes(self):
+        return {
+            self.mt5.TRADE_RETCODE_REQUOTE,
+            getattr(self.mt5, "TRADE_RETCODE_PRICE_CHANGED", 10020),
+            getattr(self.mt5, "TRADE_RETCODE_PRICE_OFF", 10021),
+        }
+
+    def send(self, request, reprice=None, on_retry=None):
+        # reprice(request) 返回新價格；返回 None 時使用券商回傳的報價
+        retry_codes = self.retry_codes()
+        if "price" in request:
+            request["deviation"] = self.deviation
+        started = time.monotonic()
+        attempts = 0
+        while True:
+            attempts += 1
+            attempt_started = time.monotonic()
+            result = self.mt5.order_send(request)
+            elapsed = time.monotonic() - started
+            if self.metrics:
+                self.metrics.observe("order_send", time.monotonic() - attempt_started)
+            retcode = result.retcode if result is not None else None
+            if retcode not in retry_codes or "price" not in request:
+                break
+            if attempts >= self.max_attempts or elapsed >= self.latency_budget:
+                break
+            if self.metrics:
+                self.metrics.increment("requotes")
+            price = reprice(request) if reprice else None
+            request["price"] = price if price else result.price
+            if on_retry:
+                on_retry(result, attempts, request["price"])
+        self.history.append(OrderAttempt(request.get("symbol"), attempts, elapsed, retcode))
+        return result, attempts, elapsed
@@ -0,0 +1,142 @@
+import sys
+import signal
+import logging
+import argparse
+from rtrade_engine import TradeEngine, EngineScheduler
+from structured_log import setup_logging
+from signal_journal import SignalJournal
+from trade_store import TradeStore
+from signal_sources import build_sources
+from poll_scheduler import parse_active_hours
+from account_fanout import FanoutEngine, load_accounts
+from connection_supervisor import ConnectionSupervisor
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="無界面反向跟單守護進程")
+    parser.add_argument("--interval", type=float, default=10.0, help="起始刷新間隔秒數 (預設 10)，之後按工作表變化自動調整")
+    parser.add_argument("--min-interval", type=float, default=2.0, help="偵測到變化後的最短刷新間隔")
+    parser.add_argument("--max-interval", type=float, default=60.0, help="長時間沒有變化時的最長刷新間隔")
+    parser.add_argument("--active-hours", default=None, help="交易時段 (週一至週五)，例如 08:00-23:00，時段內間隔不超過 5 秒")
+    parser.add_argument("--zero-confirmations", type=int, default=3, help="空值或缺失需要連續觀察到幾次才確認為 0")
+    parser.add_argument("--zero-interval", type=float, default=1.0, help="兩次 0 值觀察之間至少相隔的秒數")
+    parser.add_argument("--zero-mode", default="targeted", choices=["targeted", "cached"],
+                        help="targeted: 到期時只讀待確認產品; cached: 不額外請求，只使用正常刷新的結果")
+    parser.add_argument("--quota-per-minute", type=int, default=50, help="每分鐘 Google Sheets 讀取請求預算")
+    parser.add_argument("--fixed-interval", action="store_true", help="停用自適應，固定按 --interval 刷新")
+    parser.add_argument("--auto-trade", action="store_true", help="啟用自動交易 (真實)")
+    parser.add_argument("--accounts", default=None,
+                        help="多帳戶設定 JSON 檔案；設定後只讀取一次工作表，並把目標分發給每個帳戶的獨立進程")
+    parser.add_argument("--split-process", action="store_true",
+                        help="單一帳戶時把工作表讀取與下單分成兩個進程，經共享記憶體交換目標")
+    parser.add_argument("--symbols", default=None, help="產品對照表 JSON 檔案 (預設為程式目錄下的 symbols.json)")
+    parser.add_argument("--deviation", type=int, default=20, help="下單允許的最大滑點 (點)")
+    parser.add_argument("--trade-interval", type=float, default=10.0, help="同一產品每補充一次交易額度所需的秒數，0 表示不限制")
+    parser.add_argument("--trade-burst", type=int, default=1, help="同一產品可連續執行的交易次數")
+    parser.add_argument("--max-attempts", type=int, default=5, help="每張訂單重報價的最大嘗試次數")
+    parser.add_argument("--latency-budget", type=float, default=2.0, help="每張訂單重試的總時間上限 (秒)")
+    parser.add_argument("--health-interval", type=float, default=5.0, help="檢查 MT5 及 Google Sheets 連線的間隔秒數")
+    parser.add_argument("--max-reconnect-delay", type=float, default=60.0, help="自動重新連線退避的最長間隔秒數")
+    parser.add_argument("--no-supervisor", action="store_true", help="停用連線監控，中斷時不自動重新連線")
+    parser.add_argument("--metrics-file", default=None, help="定期寫入 Prometheus 格式性能指標的檔案")
+    parser.add_argument("--metrics-port", type=int, default=None, help="在本機此端口提供 Prometheus 性能指標")
+    parser.add_argument("--journal", default=None, help="把工作表快照、報價及下單結果追加到此檔案，供 rtrade_replay.py 重播")
+    parser.add_argument("--state-file", default="rtrade_state.json",
+                        help="引擎狀態快照檔案，重啟後恢復 0 值確認進度及目標手數；設為空字串停用")
+    parser.add_argument("--store", default=None, help="成交、持倉快照及目標手數的按日分區記錄目錄")
+    parser.add_argument("--history-days", type=int, default=7, help="啟動時開啟最近多少天的記錄")
+    parser.add_argument("--webhook-port", type=int, default=None, help="在本機此端口接收 POST /targets 推送的目標手數")
+    parser.add_argument("--webhook-token", default=None, help="Webhook 要求的 Bearer token")
+    parser.add_argument("--watch-file", default=None, help="監視此 JSON 檔案，內容變化時立即對帳")
+    parser.add_argument("--socket-port", type=int, default=None, help="在本機此 TCP 端口接收每行一個 JSON 的目標手數")
+    parser.add_argument("--log-file", default="rtrade.log", help="日誌檔案路徑")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="日誌級別，DEBUG 會記錄每輪刷新的例行訊息")
+    parser.add_argument("--log-max-bytes", type=int, default=10 * 1024 * 1024, help="日誌檔案輪替大小")
+    parser.add_argument("--log-rotate-when", default=None, help="按時間輪替日誌，例如 midnight (設定後不按大小輪替)")
+    args = parser.parse_args(argv)
+    # 多帳戶時工作表讀取與下單分屬不同進程，單一日誌無法完整重播
+    if args.journal and (args.accounts or args.split_process):
+        parser.error("--journal 不能與 --accounts 或 --split-process 同時使用")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging(args.log_file, level=getattr(logging, args.log_level), max_bytes=args.log_max_bytes,
+                  when=args.log_rotate_when)
+
+    if args.accounts or args.split_process:
+        # 交易相關設定在工作進程連接終端前傳入
+        settings = {"deviation": args.deviation, "max_attempts": args.max_attempts,
+                    "latency_budget": args.latency_budget, "trade_interval": args.trade_interval,
+                    "trade_burst": args.trade_burst, "log_file": args.log_file, "store": args.store,
+                    "health_interval": args.health_interval,
+                    "log_level": getattr(logging, args.log_level)}
+        accounts = load_accounts(args.accounts) if args.accounts else [{"name": "main"}]
+        engine = FanoutEngine(accounts, settings, on_status=lambda text: logging.info(text),
+                              symbol_file=args.symbols)
+    else:
+        engine = TradeEngine(on_status=lambda text: logging.info(text), symbol_file=args.symbols)
+    engine.auto_trade = args.auto_trade
+    engine.retry_policy.deviation = args.deviation
+    engine.retry_policy.max_attempts = args.max_attempts
+    engine.retry_policy.latency_budget = args.latency_budget
+    # 在連線 (寫入日誌的 start 記錄) 之前設定
+    engine.trade_limiter.interval = args.trade_interval
+    engine.trade_limiter.capacity = args.trade_burst
+    engine.zero_confirm.required = args.zero_confirmations
+    engine.zero_confirm.interval = args.zero_interval
+    engine.zero_confirm.mode = args.zero_mode
+    # 狀態快照在頻率限制設定之後才恢復，否則恢復的令牌會被重建的令牌桶丟棄
+    if args.state_file:
+        engine.open_state(args.state_file)
+    if args.journal:
+        engine.journal = SignalJournal(args.journal)
+    if args.store:
+        engine.store = TradeStore(args.store)
+        engine.open_history(args.history_days)
+
+    # 連線失敗時以非零代碼退出，交由外部監控程式重啟
+    if not engine.connect_to_mt5_and_fetch_positions():
+        return 1
+    if not engine.connect_to_mt5_and_google_sheets(refresh=False):
+        engine.shutdown()
+        return 1
+
+    engine.poller.base_interval = engine.poller.interval = args.interval
+    engine.poller.min_interval = args.min_interval
+    engine.poller.max_interval = args.max_interval
+    engine.poller.active_hours = parse_active_hours(args.active_hours)
+    engine.sheet_quota.limit = args.quota_per_minute
+    if not args.no_supervisor:
+        engine.supervisor = ConnectionSupervisor(engine, interval=args.health_interval, max_backoff=args.max_reconnect_delay)
+    scheduler = EngineScheduler(engine, refresh_interval=args.interval if args.fixed_interval else None)
+    engine.start_signal_sources(build_sources({
+        "webhook": {"port": args.webhook_port, "token": args.webhook_token} if args.webhook_port else None,
+        "file": {"path": args.watch_file} if args.watch_file else None,
+        "socket": {"port": args.socket_port} if args.socket_port else None,
+    }))
+
+    def handle_signal(signum, frame):
+        logging.info(f"收到信號 {signum}，正在停止")
+        scheduler.stop_event.set()
+
+    if args.metrics_port:
+        engine.metrics.start_http_server(args.metrics_port)
+    if args.metrics_file:
+        engine.metrics.start_file_writer(args.metrics_file, scheduler.stop_event)
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    engine.log_message(f"信息: 守護進程已啟動，刷新間隔 {args.interval} 秒，自動交易: {'啟用' if args.auto_trade else '禁用'}")
+    try:
+        scheduler.run()
+    finally:
+        engine.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
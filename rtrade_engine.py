@@ -0,0 +1,817 @@
+import sys
+import os
+import time
+import queue
+import logging
+import threading
+import MetaTrader5 as mt5
+from datetime import datetime
+from sheet_index import SheetRowIndex, snapshot_fingerprint
+from symbol_map import load_symbol_map, build_symbol_specs
+from position_book import PositionBook
+from execution_planner import plan_orders
+from market_cache import MarketDataCache
+from retry_policy import RequotePolicy
+from metrics import MetricsRegistry
+from zero_confirm import ZeroConfirmation, CONFIRMED, IGNORED
+from trade_limiter import TradeLimiter
+from state_snapshot import StateSnapshot
+from sheets_client import SheetsClient
+from poll_scheduler import QuotaTracker, AdaptivePoller, rate_limit_delay, CHANGED, UNCHANGED, THROTTLED, DEFERRED, FAILED
+
+
+def _noop(*args):
+    pass
+
+
+def base_path():
+    if getattr(sys, 'frozen', False):
+        return sys._MEIPASS
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+class TradeEngine:
+    # 不依賴 Qt 的反向跟單核心：讀取工作表、比對持倉、執行交易
+    # 界面或守護進程透過回調函數接收日誌、狀態和持倉快照
+    def __init__(self, on_log=None, on_status=None, on_table=None,
+                 on_mt5_connected=None, on_sheets_connected=None, symbol_file=None, symbol_map=None,
+                 on_targets_pending=None, state_file=None):
+        # 定義產品名稱映射 (工作表產品 -> MT5 品種)
+        if symbol_map is not None:
+            self.symbols = build_symbol_specs(symbol_map)
+        else:
+            self.symbols = load_symbol_map(symbol_file or os.path.join(base_path(), 'symbols.json'))
+        self.symbols_by_google = {spec.google: spec for spec in self.symbols}
+        self.symbols_by_internal = {spec.internal: spec for spec in self.symbols}
+        self.symbols_by_mt5 = {spec.mt5: spec for spec in self.symbols}
+
+        # 回調函數
+        self.on_log = on_log or _noop
+        self.on_status = on_status or _noop
+        self.on_table = on_table or _noop
+        self.on_mt5_connected = on_mt5_connected or _noop
+        self.on_sheets_connected = on_sheets_connected or _noop
+        # 推送信號源在自己的線程收到目標後呼叫，通知引擎所在線程處理佇列
+        self.on_targets_pending = on_targets_pending or _noop
+
+        # 初始化 Google Sheets 客戶端
+        self.gc = None
+        self.sheets_client = None
+        self.sheets_connected = False
+        # 連續失敗的工作表讀取次數，連線監控據此判斷是否需要確認 Sheets 連線
+        self.sheet_failures = 0
+        self.worksheet = None
+        self.spreadsheet = None
+        self.sheet_index = None
+
+        # 初始化 MT5 連線狀態；terminal 為 mt5.initialize 參數 (path/login/password/server)，空時連接預設終端
+        self.mt5_connected = False
+        self.terminal = {}
+        # 連線監控 (ConnectionSupervisor)，設定後中斷時自動暫停及重新連線
+        self.supervisor = None
+        self.auto_trade = False
+
+        # 初始化數據
+        self.current_positions = {}
+        self.clock = time.monotonic
+        self.now = datetime.now
+        self.journal = None
+        self.store = None
+        self.position_book = PositionBook(mt5.ORDER_TYPE_BUY, clock=self.clock)
+        self.metrics = MetricsRegistry()
+        self.market = MarketDataCache(mt5, metrics=self.metrics)
+        self.retry_policy = RequotePolicy(mt5, metrics=self.metrics)
+        self.hedging_account = True
+        self.fifo_close = False
+        self.google_positions = {}
+        self.last_trade_time = None
+        # 每個產品的交易頻率限制，被限制的目標排隊等候而不是丟棄
+        self.trade_limiter = TradeLimiter(clock=lambda: self.clock())
+        self.zero_confirm = ZeroConfirmation(clock=lambda: self.clock())
+        self.last_non_zero_lots = {}
+        self.last_snapshot_hash = None
+        self.cycle_started = None
+        # 推送信號源的目標手數；工作表對應儲存格未再變化前以推送值為準
+        self.target_queue = queue.Queue()
+        self.pushed_lots = {}
+        self.sheet_cells = {}
+        self.sources = []
+        # Sheets 讀取配額及自適應刷新間隔，時鐘經由 self.clock 以便重播時替換
+        self.sheet_quota = QuotaTracker(clock=lambda: self.clock())
+        self.poller = AdaptivePoller(self.sheet_quota, clock=lambda: self.clock(), wall_clock=lambda: self.now())
+        # 狀態快照：每次變化時保存，啟動時恢復；單調時鐘與牆上時間之間的差值在本進程內固定
+        self.state_snapshot = None
+        self.state_offset = self.now().timestamp() - self.clock()
+        if state_file:
+            self.open_state(state_file)
+
+    def log_message(self, message, level=None, **fields):
+        # 未指定級別時按訊息前綴判斷；每輪刷新的例行訊息使用 DEBUG，生產環境可關閉
+        if level is None:
+            level = logging.ERROR if message.startswith("錯誤") else logging.WARNING if message.startswith("警告") else logging.INFO
+        if not logging.getLogger().isEnabledFor(level):
+            return
+        logging.log(level, message, extra={"fields": fields})
+        self.on_log(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), message)
+
+    def export_state(self):
+        return {
+            "last_non_zero_lots": dict(self.last_non_zero_lots),
+            "google_positions": dict(self.google_positions),
+            "pushed_lots": dict(self.pushed_lots),
+            "sheet_cells": dict(self.sheet_cells),
+            "zero_checks": self.zero_confirm.export(self.state_offset),
+            "trade_buckets": self.trade_limiter.export(self.state_offset),
+            "last_trade_time": self.last_trade_time.isoformat() if self.last_trade_time else None,
+        }
+
+    def open_state(self, state_file):
+        # 頻率限制設定不同時令牌桶會被重建，需在設定 trade_limiter 之後才恢復
+        self.state_snapshot = StateSnapshot(state_file)
+        self.restore_state()
+
+    def save_state(self):
+        if not self.state_snapshot:
+            return
+        try:
+            self.state_snapshot.save(self.export_state())
+        except OSError as e:
+            self.log_message(f"錯誤: 無法寫入狀態快照 {self.state_snapshot.path}: {str(e)}")
+
+    def restore_state(self):
+        def known(values):
+            return {key: value for key, value in values.items() if key in self.symbols_by_internal}
+
+        try:
+            data = self.state_snapshot.load()
+            if data is None:
+                return
+            # 非 0 手數及儲存格不論快照多舊都恢復，重啟後空值仍需經過 0 值確認而不是直接平倉
+            age = self.now().timestamp() - data["saved_at"]
+            last_non_zero_lots = known(data["last_non_zero_lots"])
+            sheet_cells = known(data["sheet_cells"])
+            last_trade_time = datetime.fromisoformat(data["last_trade_time"]) if data["last_trade_time"] else None
+            trade_buckets = known(data["trade_buckets"])
+            fresh = age <= self.state_snapshot.max_age
+            if fresh:
+                google_positions = known(data["google_positions"])
+                pushed_lots = known(data["pushed_lots"])
+                zero_checks = known(data["zero_checks"])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            self.log_message(f"警告: 無法讀取狀態快照 {self.state_snapshot.path}，以空白狀態啟動: {str(e)}")
+            return
+
+        self.last_non_zero_lots = last_non_zero_lots
+        self.sheet_cells = sheet_cells
+        self.last_trade_time = last_trade_time
+        self.trade_limiter.restore(trade_buckets, self.state_offset)
+        restored = "非 0 手數"
+        if fresh:
+            self.google_positions = google_positions
+            self.pushed_lots = pushed_lots
+            self.zero_confirm.restore(zero_checks, self.state_offset)
+            restored = "目標手數、非 0 手數及 0 值確認進度"
+        self.log_message(f"信息: 已從狀態快照恢復{restored} (保存於 {age:.0f} 秒前)")
+
+    def update_table(self):
+        self.on_table(dict(self.current_positions), dict(self.google_positions), self.zero_confirm.states())
+
+    def run_due_checks(self):
+        # 由調度器定期呼叫：先檢查連線，再執行令牌已到位的排隊交易，最後在有產品到期時以定向讀取執行 0 值驗證；
+        # 連線中斷時暫停，配額用盡或被限流時等到下一次呼叫
+        if self.supervisor:
+            self.supervisor.tick()
+            if self.supervisor.paused:
+                return
+        due_trades = self.trade_limiter.due()
+        if due_trades:
+            for product in due_trades:
+                if product not in self.google_positions or not self.mt5_connected:
+                    self.trade_limiter.discard(product)
+            due_trades = [product for product in due_trades if product in self.trade_limiter.pending]
+            if due_trades:
+                self.execute_trades(due_trades)
+        if not self.zero_confirm.due() or self.sheet_quota.wait_time() > 0:
+            return
+        self.verify_zero_position()
+
+    def next_due(self):
+        # 最早一個排隊交易或 0 值驗證的到期時間，沒有時返回 None
+        times = [t for t in (self.trade_limiter.next_due(), self.zero_confirm.next_due()) if t is not None]
+        return min(times) if times else None
+
+    def next_refresh_interval(self):
+        # cached 模式只靠正常刷新確認 0 值，待確認期間把刷新間隔縮短到確認間隔
+        interval = self.poller.next_interval()
+        if self.zero_confirm.pending and self.zero_confirm.next_due() is None:
+            interval = min(interval, max(self.zero_confirm.interval, self.sheet_quota.min_spacing(),
+                                         self.sheet_quota.wait_time()))
+        return interval
+
+    def connect_to_mt5_and_fetch_positions(self):
+        try:
+            if not mt5.initialize(**self.terminal):
+                error_msg = f"MT5 初始化失敗，錯誤代碼: {mt5.last_error()}"
+                self.log_message(f"錯誤: {error_msg}")
+                self.on_status("狀態: MT5 連線失敗")
+                return False
+
+            self.mt5_connected = True
+            self.market.clear()
+            account_info = mt5.account_info()
+            self.hedging_account = account_info.margin_mode == mt5.ACCOUNT_MARGIN_MODE_RETAIL_HEDGING
+            self.fifo_close = bool(getattr(account_info, 'fifo_close', False))
+            self.log_message(f"信息: MT5 連線成功，帳戶: {account_info.login}")
+            if self.journal:
+                self.journal.record_start(self.symbols, self.hedging_account, self.fifo_close, self.trade_limiter,
+                                          self.zero_confirm)
+
+            self.update_mt5_positions()
+            self.update_table()
+            self.on_status("狀態: 已連接到 MT5，等待 Google Sheets 連線")
+            self.on_mt5_connected()
+            return True
+
+        except Exception as e:
+            error_msg = f"MT5 連線錯誤: {str(e)}"
+            self.log_message(f"錯誤: {error_msg}")
+            self.on_status("狀態: MT5 連線失敗")
+            self.mt5_connected = False
+            return False
+
+    def connect_to_mt5_and_google_sheets(self, refresh=True):
+        try:
+            # 連線及令牌在整個進程內重用，重新連線時不再重新授權
+            if self.sheets_client is None:
+                json_path = os.path.join(base_path(), 'impactful-name-455509-b6-b07e866843f7.json')
+                self.sheets_client = SheetsClient(json_path)
+                self.gc = self.sheets_client.client
+                self.log_message(f"信息: 服務帳號: {self.sheets_client.service_account_email}")
+            self.sheets_client.start()
+
+            try:
+                started = time.perf_counter()
+                worksheet = self.sheets_client.open_worksheet("data", "Net Position")
+                self.spreadsheet = worksheet.spreadsheet
+                self.log_message(f"信息: 可用工作表: {self.sheets_client.worksheet_titles['data']}", logging.DEBUG)
+                self.attach_worksheet(worksheet)
+                self.log_message(f"信息: 已連線工作表: {self.worksheet.title}，耗時 {(time.perf_counter() - started) * 1000:.0f} 毫秒")
+            except Exception as e:
+                error_msg = f"無法訪問工作表: {str(e)}"
+                self.log_message(f"錯誤: {error_msg}")
+                self.sheets_connected = False
+                return False
+
+            self.sheets_connected = True
+            self.on_status("狀態: 已連接到 MT5 和 Google Sheets")
+            self.on_sheets_connected()
+            if refresh:
+                self.refresh_data()
+            return True
+
+        except Exception as e:
+            error_msg = f"Google Sheets 連線錯誤: {str(e)}"
+            self.log_message(f"錯誤: {error_msg}")
+            self.on_status("狀態: Google Sheets 連線失敗")
+            self.sheets_connected = False
+            return False
+
+    def check_mt5(self):
+        # 終端已連接到交易伺服器且帳戶資料可讀取時返回 True
+        try:
+            terminal = mt5.terminal_info()
+            return terminal is not None and terminal.connected and mt5.account_info() is not None
+        except Exception:
+            return False
+
+    def reconnect_mt5(self):
+        try:
+            mt5.shutdown()
+        except Exception:
+            pass
+        self.mt5_connected = False
+        return self.connect_to_mt5_and_fetch_positions()
+
+    def check_sheets(self):
+        # 只取 spreadsheetId 的中繼資料請求，回應很小，同樣計入讀取配額
+        try:
+            self.sheet_quota.record()
+            self.worksheet.spreadsheet.fetch_sheet_metadata({"fields": "spreadsheetId"})
+            return True
+        except Exception as e:
+            self.log_message(f"警告: Google Sheets 連線檢查失敗: {str(e)}")
+            return False
+
+    def reconnect_sheets(self):
+        # 丟棄連線池中可能已失效的連線並刷新令牌，再以快取的工作表重新連線及確認
+        if self.sheets_client:
+            self.sheets_client.reset()
+        if not self.connect_to_mt5_and_google_sheets(refresh=False):
+            return False
+        if not self.check_sheets():
+            self.sheets_connected = False
+            return False
+        self.sheet_failures = 0
+        return True
+
+    def attach_worksheet(self, worksheet):
+        self.worksheet = worksheet
+        self.sheet_index = SheetRowIndex(worksheet, metrics=self.metrics, quota=self.sheet_quota)
+        self.last_snapshot_hash = None
+
+    def open_history(self, days):
+        # 以 memmap 映射最近 N 天的記錄，不讀取內容，啟動時幾乎不耗時
+        history = {kind: self.store.open_days(kind, days) for kind in ("deals", "positions", "targets")}
+        counts = {kind: sum(len(records) for day, records in parts) for kind, parts in history.items()}
+        self.log_message(f"信息: 已開啟最近 {days} 天記錄: 成交 {counts['deals']} 筆, "
+                         f"持倉快照 {counts['positions']} 筆, 目標手數 {counts['targets']} 筆")
+        return history
+
+    def update_mt5_positions(self):
+        # 一次取得所有持倉，由持倉簿以向量方式計算每個品種的淨持倉
+        with self.metrics.timer("positions_get"):
+            positions = mt5.positions_get()
+        if self.journal:
+            self.journal.record_positions(positions)
+        self.position_book.update(positions)
+        if self.store:
+            self.store.append_positions(self.now().timestamp(), self.position_book.positions)
+        self.current_positions = {}
+        for spec in self.symbols:
+            net_lots, long_lots, short_lots = self.position_book.exposure(spec.mt5)
+            self.current_positions[spec.internal] = net_lots
+            self.log_message(f"信息: MT5 淨持倉: {spec.internal}, 手數: {net_lots} (買入 {long_lots}, 賣出 {short_lots})",
+                             logging.DEBUG, symbol=spec.internal, lots=net_lots)
+
+    def send_planned_order(self, symbol, order, tick):
+        side_type = mt5.ORDER_TYPE_BUY if order.side > 0 else mt5.ORDER_TYPE_SELL
+        volume = self.market.normalize_volume(symbol, order.volume)
+        if volume <= 0.0:
+            self.log_message(f"警告: {symbol} 手數 {order.volume} 低於最小交易手數，跳過")
+            return None
+        order = order._replace(volume=volume)
+        request = {
+            "symbol": symbol,
+            "volume": volume,
+            "type_time": mt5.ORDER_TIME_GTC,
+            "type_filling": self.market.filling_mode(symbol),
+        }
+        if order.kind == "close_by":
+            request.update({"action": mt5.TRADE_ACTION_CLOSE_BY, "position": order.ticket, "position_by": order.by_ticket})
+            description = f"對沖平倉 #{order.ticket} / #{order.by_ticket} {order.volume:.2f} 手"
+        else:
+            request.update({"action": mt5.TRADE_ACTION_DEAL, "type": side_type,
+                            "price": tick.ask if side_type == mt5.ORDER_TYPE_BUY else tick.bid})
+            if order.kind == "close":
+                request["position"] = order.ticket
+                description = f"平倉 #{order.ticket} {'買入' if order.side > 0 else '賣出'} {order.volume:.2f} 手"
+            else:
+                description = f"{'買入' if order.side > 0 else '賣出'} {order.volume:.2f} 手"
+
+        def reprice(request):
+            self.market.invalidate_ticks(symbol)
+            tick = self.market.tick(symbol)
+            if self.journal:
+                self.journal.record_tick(symbol, tick)
+            if not tick:
+                return None
+            return tick.ask if request["type"] == mt5.ORDER_TYPE_BUY else tick.bid
+
+        def on_retry(result, attempts, price):
+            self.log_message(f"警告: 出現 Requote (第 {attempts} 次)，重新以新價格 {price} 執行")
+
+        result, attempts, elapsed = self.retry_policy.send(request, reprice, on_retry)
+        if self.journal:
+            self.journal.record_order(request, result, attempts)
+        if self.store and result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
+            side = 0 if order.kind == "close_by" else order.side
+            self.store.append_deal(self.now().timestamp(), symbol, order.kind, side, result.volume or volume,
+                                   result.price, result.deal, result.retcode)
+        if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
+            self.metrics.increment("orders_filled")
+            if self.cycle_started is not None:
+                self.metrics.observe("signal_to_fill", time.perf_counter() - self.cycle_started)
+            self.log_message(f"信息: 交易成功 - {symbol}: {description}，嘗試 {attempts} 次，耗時 {elapsed * 1000:.0f} 毫秒",
+                             symbol=symbol, lots=volume, retcode=result.retcode, latency_ms=round(elapsed * 1000, 1), attempts=attempts)
+            return description
+        self.metrics.increment("order_failures")
+        retcode = result.retcode if result is not None else mt5.last_error()
+        comment = result.comment if result is not None else ""
+        error_msg = f"交易失敗 ({description})，錯誤代碼: {retcode}, 詳情: {comment}，嘗試 {attempts} 次，耗時 {elapsed * 1000:.0f} 毫秒"
+        self.log_message(f"錯誤: {error_msg}", symbol=symbol, lots=volume, retcode=retcode,
+                         latency_ms=round(elapsed * 1000, 1), attempts=attempts)
+        return None
+
+    def verify_zero_position(self):
+        pending = [self.symbols_by_internal[internal] for internal in self.zero_confirm.due()]
+        if not pending:
+            return
+        try:
+            entries = self.sheet_index.read([spec.google for spec in pending])
+            if self.journal:
+                self.journal.record_sheet("zero_check", entries, self.auto_trade)
+            resolved = False
+            for spec in pending:
+                entry = entries.get(spec.google)
+                lot = 0.0
+                if entry is not None:
+                    row_number, product, lot_str = entry
+                    if lot_str != "":
+                        try:
+                            clean_lot = lot_str.replace(',', '').replace(' ', '')
+                            lot = float(clean_lot)
+                        except ValueError:
+                            self.log_message(f"錯誤: 行 {row_number} {spec.google} 手數格式無效: '{lot_str}'")
+                            continue
+
+                if lot != 0.0:
+                    self.google_positions[spec.internal] = lot
+                    self.last_non_zero_lots[spec.internal] = lot
+                    self.zero_confirm.cancel(spec.internal)
+                    self.log_message(f"信息: {spec.google} 檢測到非 0 值 ({lot})，停止 0 值檢查")
+                    resolved = True
+                elif self.observe_zero(spec, "定向讀取"):
+                    resolved = True
+
+            self.update_table()
+            # execute_trades 在交易後保存狀態，不交易時在此保存
+            if resolved and self.auto_trade:
+                self.execute_trades()
+            else:
+                self.save_state()
+        except Exception as e:
+            retry_after = rate_limit_delay(e)
+            if retry_after is not None:
+                delay = self.sheet_quota.throttle(retry_after)
+                self.log_message(f"警告: Google Sheets 請求過於頻繁 (429)，0 值驗證延後 {delay:.0f} 秒")
+                return
+            self.log_message(f"錯誤: 驗證 0 值時出錯: {str(e)}")
+            self.zero_confirm.clear()
+            self.update_table()
+
+    def refresh_data(self):
+        # 返回本輪結果 (changed / unchanged / throttled / deferred / failed)，並據此調整下一次刷新間隔
+        if self.supervisor and self.supervisor.paused:
+            return DEFERRED
+        status = self.refresh_cycle()
+        self.poller.record_result(status)
+        return status
+
+    def refresh_cycle(self):
+        if not self.worksheet or not self.mt5_connected:
+            self.log_message("錯誤: 未連接到 MT5 或未找到有效的工作表")
+            return FAILED
+
+        wait = self.sheet_quota.wait_time()
+        if wait > 0:
+            self.log_message(f"警告: Google Sheets 讀取配額已用盡或限流中，{wait:.0f} 秒後再刷新")
+            return DEFERRED
+
+        try:
+            self.cycle_started = time.perf_counter()
+            with self.metrics.timer("sheet_fetch"):
+                entries = self.sheet_index.read([spec.google for spec in self.symbols])
+            self.sheet_failures = 0
+            if self.journal:
+                self.journal.record_sheet("refresh", entries, self.auto_trade)
+            # 工作表內容未變且持倉已同步時跳過整個刷新流程
+            fingerprint = snapshot_fingerprint(entries)
+            # 有產品待確認 0 值時不跳過，本輪讀取也計入確認次數
+            if fingerprint == self.last_snapshot_hash and not self.zero_confirm.pending and \
+                    (not self.auto_trade or self.positions_in_sync()):
+                self.metrics.increment("skipped_cycles")
+                return UNCHANGED
+            changed = fingerprint != self.last_snapshot_hash
+
+            self.log_message("信息: 開始刷新數據", logging.DEBUG)
+            self.update_mt5_positions()
+
+            parse_started = time.perf_counter()
+            self.google_positions = {}
+            missing = []
+            for spec in self.symbols:
+                entry = entries.get(spec.google)
+                cell = entry[2] if entry is not None else None
+                if spec.internal in self.pushed_lots:
+                    # 推送前尚未讀過該儲存格時，以本次讀到的值作為基準並保留推送值；基準之後有變化才改用工作表
+                    if spec.internal not in self.sheet_cells:
+                        self.sheet_cells[spec.internal] = cell
+                    if self.sheet_cells[spec.internal] == cell:
+                        self.google_positions[spec.internal] = self.pushed_lots[spec.internal]
+                        continue
+                    del self.pushed_lots[spec.internal]
+                self.sheet_cells[spec.internal] = cell
+                found = False
+                if entry is not None:
+                    row_number, product, lot_str = entry
+                    if lot_str == "":
+                        if spec.internal in self.last_non_zero_lots and not self.observe_zero(spec, "檢測到空值"):
+                            continue
+                        self.google_positions[spec.internal] = 0.0
+                        found = True
+                        self.log_message(f"信息: 找到 {spec.google} 數據 - 行 {row_number}: 產品='{product}', 手數=0.0 (空格)",
+                                         logging.DEBUG, symbol=spec.internal, lots=0.0)
+                    else:
+                        try:
+                            clean_lot = lot_str.replace(',', '').replace(' ', '')
+                            lot = float(clean_lot)
+                            self.google_positions[spec.internal] = lot
+                            self.last_non_zero_lots[spec.internal] = lot
+                            found = True
+                            self.zero_confirm.cancel(spec.internal)
+                            self.log_message(f"信息: 找到 {spec.google} 數據 - 行 {row_number}: 產品='{product}', 手數={lot}",
+                                             logging.DEBUG, symbol=spec.internal, lots=lot)
+                        except ValueError:
+                            self.log_message(f"錯誤: 行 {row_number} {spec.google} 手數格式無效: '{lot_str}'")
+
+                if not found:
+                    if spec.internal in self.last_non_zero_lots:
+                        self.observe_zero(spec, f"未找到 {spec.google}")
+                        continue
+                    self.google_positions[spec.internal] = 0.0
+                    missing.append(spec.google)
+                    self.log_message(f"警告: 在工作表中未找到小寫 '{spec.google}' 產品或手數為空格，假設 Google Sheets 持倉為 0")
+
+            self.metrics.observe("row_parse", time.perf_counter() - parse_started)
+            if self.store:
+                self.store.append_targets(self.now().timestamp(), {self.symbols_by_internal[product].mt5: lot
+                                                                   for product, lot in self.google_positions.items()})
+            if missing:
+                names = ", ".join(f"行 {self.sheet_index.rows[product]}: '{product}'" for product in self.sheet_index.product_names())
+                self.log_message(f"信息: 工作表中所有產品名稱: {names}", logging.DEBUG)
+
+            self.update_table()
+            # 狀態在下單之後才寫入磁碟，不延遲交易
+            if self.auto_trade:
+                self.execute_trades()
+            else:
+                self.save_state()
+
+            loaded = len(self.symbols) - len(missing) - len(self.zero_confirm.pending)
+            status = f"已加載 {loaded} 個產品數據"
+            if missing:
+                status += f"，未找到 {', '.join(missing)}，假設持倉為 0"
+            self.on_status(f"狀態: {status}")
+            self.log_message(f"信息: 狀態: {status}", logging.DEBUG)
+            # 整輪完成後才記下指紋，中途出錯時下一輪仍視為有變化並重新處理
+            self.last_snapshot_hash = fingerprint
+            return CHANGED if changed else UNCHANGED
+
+        except Exception as e:
+            retry_after = rate_limit_delay(e)
+            if retry_after is not None:
+                delay = self.sheet_quota.throttle(retry_after)
+                self.log_message(f"警告: Google Sheets 請求過於頻繁 (429)，暫停讀取 {delay:.0f} 秒")
+                self.on_status("狀態: Google Sheets 限流中")
+                return THROTTLED
+            self.sheet_failures += 1
+            error_msg = f"刷新數據時出錯: {str(e)}"
+            self.log_message(f"錯誤: {error_msg}")
+            self.on_status("狀態: 刷新失敗")
+            return FAILED
+
+    def start_signal_sources(self, sources):
+        for source in sources:
+            try:
+                source.start(self.submit_targets)
+                self.sources.append(source)
+                self.log_message(f"信息: 已啟動推送信號源 {source.name}")
+            except OSError as e:
+                self.log_message(f"錯誤: 無法啟動信號源 {source.name}: {str(e)}")
+
+    def submit_targets(self, targets, source):
+        # 可在任何線程呼叫；targets 為 {工作表產品名稱: 手數}
+        self.target_queue.put((source, targets))
+        self.on_targets_pending()
+
+    def process_pending_targets(self):
+        # 合併佇列中所有推送，同一產品只保留最新值，一次性對帳
+        merged = {}
+        sources = []
+        while True:
+            try:
+                source, targets = self.target_queue.get_nowait()
+            except queue.Empty:
+                break
+            merged.update({str(product).strip().lower(): value for product, value in targets.items()})
+            if source not in sources:
+                sources.append(source)
+        if merged:
+            self.apply_pushed_targets(merged, "、".join(sources))
+
+    def apply_pushed_targets(self, targets, source):
+        # 推送來源的數值視為確定值，空值即為 0，不需要 0 值驗證
+        self.cycle_started = time.perf_counter()
+        if self.journal:
+            self.journal.record_push(source, targets, self.auto_trade)
+        changed = []
+        for product, value in targets.items():
+            spec = self.symbols_by_google.get(product)
+            if spec is None:
+                self.log_message(f"警告: {source} 推送了未知產品 '{product}'，已忽略")
+                continue
+            try:
+                text = str(value).replace(',', '').replace(' ', '')
+                lot = float(text) if text else 0.0
+            except ValueError:
+                self.log_message(f"錯誤: {source} 推送的 {product} 手數格式無效: '{value}'")
+                continue
+            self.pushed_lots[spec.internal] = lot
+            self.zero_confirm.cancel(spec.internal)
+            if lot != 0.0:
+                self.last_non_zero_lots[spec.internal] = lot
+            if self.google_positions.get(spec.internal) != lot:
+                self.google_positions[spec.internal] = lot
+                changed.append(f"{spec.google}={lot}")
+        if not changed:
+            self.save_state()
+            return
+        self.log_message(f"信息: 收到 {source} 推送目標: {', '.join(changed)}")
+        self.update_table()
+        if self.auto_trade and self.mt5_connected:
+            self.execute_trades()
+        else:
+            self.save_state()
+
+    def observe_zero(self, spec, reason):
+        # 把一次讀到的 0 值交給確認狀態機，確認後把目標設為 0 並返回 True
+        first = not self.zero_confirm.is_pending(spec.internal)
+        result, count, elapsed = self.zero_confirm.observe(spec.internal)
+        if result == IGNORED:
+            return False
+        if result == CONFIRMED:
+            self.google_positions[spec.internal] = 0.0
+            self.last_non_zero_lots.pop(spec.internal, None)
+            self.log_message(f"信息: {spec.google} 連續 {count} 次檢測到 0 ({elapsed:.1f} 秒)，確認 Google Sheets 持倉為 0")
+            return True
+        if first:
+            self.log_message(f"信息: {reason}，啟動 {spec.google} 0 值驗證 (第 1/{self.zero_confirm.required} 次)")
+        else:
+            self.log_message(f"信息: {spec.google} 第 {count}/{self.zero_confirm.required} 次檢測到 0 ({reason})，等待下一次檢查")
+        return False
+
+    def positions_in_sync(self):
+        for product, google_lot in self.google_positions.items():
+            if abs(-google_lot - self.current_positions.get(product, 0.0)) >= 0.01:
+                return False
+        return True
+
+    @staticmethod
+    def calculate_trade_instruction(current, google_lot):
+        desired_mt5_position = -google_lot
+        difference = desired_mt5_position - current
+        if abs(difference) < 0.01:
+            return "無操作"
+        elif difference > 0:
+            return f"買入 {abs(difference):.2f} 手"
+        else:
+            return f"賣出 {abs(difference):.2f} 手"
+
+    def generate_trades(self):
+        if not self.google_positions:
+            self.log_message("警告: 未找到交易數據，假設 Google Sheets 持倉為 0")
+            self.google_positions = {spec.internal: 0.0 for spec in self.symbols}
+
+        trade_instructions = []
+        for product, google_lot in self.google_positions.items():
+            current_lot = self.current_positions.get(product, 0.0)
+            desired_mt5_position = -google_lot
+            difference = desired_mt5_position - current_lot
+            if abs(difference) >= 0.01:
+                action = "BUY" if difference > 0 else "SELL"
+                lots = abs(difference)
+                trade_instructions.append(f"{product}: {action} {lots:.2f} lots at market price")
+
+        if trade_instructions:
+            msg = "交易指令 (反向):\n" + "\n".join(trade_instructions)
+            self.log_message(f"信息: 交易指令生成成功:\n{msg}")
+        else:
+            self.log_message("信息: 當前無需交易")
+
+    def execute_trades(self, products=None):
+        # products 為 None 時處理所有產品，否則只處理指定產品 (排隊交易到期時)；不論是否下單都在結束時保存狀態
+        if not self.google_positions and self.mt5_connected and self.zero_confirm.pending:
+            # 所有產品都在等待 0 值確認，沒有可執行的目標
+            self.save_state()
+            return
+        if not self.google_positions or not self.mt5_connected:
+            self.log_message("警告: 未連接到 MT5 或未找到交易數據")
+            self.save_state()
+            return
+
+        current_time = self.now()
+
+        # 手動執行時持倉簿可能已過時，重新讀取後再計劃訂單
+        if self.clock() - self.position_book.updated_at > 1.0:
+            self.update_mt5_positions()
+
+        executed_trades = []
+        for product, google_lot in self.google_positions.items():
+            if products is not None and product not in products:
+                continue
+            current_lot = self.current_positions.get(product, 0.0)
+            desired_mt5_position = -google_lot
+            difference = desired_mt5_position - current_lot
+
+            if abs(difference) < 0.01:
+                self.trade_limiter.discard(product)
+                continue
+
+            # 令牌不足時只保留最新目標排隊，令牌到位時以當時的工作表手數執行，中間的目標被合併
+            if not self.trade_limiter.acquire(product):
+                wait, replaced = self.trade_limiter.defer(product, desired_mt5_position)
+                action = "更新排隊目標" if replaced else "排隊等候"
+                self.log_message(f"信息: 交易頻率限制，{action}，目標持倉 {desired_mt5_position}，{wait:.1f} 秒後執行",
+                                 logging.DEBUG if replaced else None, symbol=product, lots=difference)
+                continue
+
+            symbol = self.symbols_by_internal[product].mt5
+
+            symbol_info = self.market.tick(symbol)
+            if self.journal:
+                self.journal.record_tick(symbol, symbol_info)
+            if not symbol_info:
+                error_msg = f"無法獲取 {symbol} 的市場價格"
+                self.log_message(f"錯誤: {error_msg}")
+                continue
+
+            # 由持倉簿計算最少的平倉、對沖平倉及開倉指令
+            orders = plan_orders(self.position_book.positions_for(symbol), desired_mt5_position,
+                                 hedging=self.hedging_account, fifo=self.fifo_close, buy_type=mt5.ORDER_TYPE_BUY)
+            self.log_message(f"信息: 當前持倉: {current_lot}, 目標持倉: {desired_mt5_position}, 需要交易: {difference}, 計劃 {len(orders)} 張訂單",
+                             symbol=product, lots=difference)
+
+            for order in orders:
+                description = self.send_planned_order(symbol, order, symbol_info)
+                if description is None:
+                    break
+                executed_trades.append(f"{product}: {description} (真實) @ {current_time}")
+
+        if executed_trades:
+            self.update_mt5_positions()
+            msg = "已執行交易 (反向, 真實):\n" + "\n".join(executed_trades)
+            self.log_message(f"信息: 交易執行成功:\n{msg}")
+            self.last_trade_time = current_time
+            self.update_table()
+        else:
+            self.log_message("信息: 無需執行交易", logging.DEBUG)
+        self.save_state()
+
+    def shutdown(self):
+        # 先保存再清除 0 值確認，重啟後繼續未完成的確認
+        self.save_state()
+        self.zero_confirm.clear()
+        self.trade_limiter.clear()
+        for source in self.sources:
+            source.stop()
+        self.sources = []
+        if self.mt5_connected:
+            mt5.shutdown()
+            self.mt5_connected = False
+            self.log_message("信息: MT5 連線已關閉")
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        if self.store:
+            self.store.close()
+        if self.sheets_client:
+            self.sheets_client.close()
+            self.sheets_client = None
+
+
+class EngineScheduler:
+    # 以單一背景線程取代 QTimer：定期刷新並處理到期的 0 值驗證
+    # refresh_interval 為 None 時按 engine.poller 的自適應間隔刷新
+    def __init__(self, engine, refresh_interval=None, poll_interval=0.2):
+        self.engine = engine
+        self.refresh_interval = refresh_interval
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        # 推送信號源收到目標時喚醒調度線程，不必等待下一次輪詢
+        self.wake_event = threading.Event()
+        engine.on_targets_pending = self.wake_event.set
+        self.thread = None
+
+    def run(self):
+        next_refresh = time.monotonic()
+        while not self.stop_event.is_set():
+            self.engine.process_pending_targets()
+            now = time.monotonic()
+            if now >= next_refresh:
+                self.engine.refresh_data()
+                interval = self.refresh_interval or self.engine.next_refresh_interval()
+                next_refresh = time.monotonic() + interval
+            self.engine.run_due_checks()
+            self.wake_event.wait(max(0.0, min(self.poll_interval, next_refresh - time.monotonic())))
+            self.wake_event.clear()
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="rtrade-scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
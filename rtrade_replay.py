@@ -0,0 +1,231 @@
+import sys
+import time
+import bisect
+import logging
+import argparse
+from datetime import datetime
+from bench.fake_mt5 import install
+from bench.virtual_clock import VirtualClock
+from signal_journal import read_journal
+
+# 以模擬券商取代 MetaTrader5，必須在匯入 rtrade_engine 之前執行
+BROKER = install()
+
+from rtrade_engine import TradeEngine
+
+DONE = BROKER.TRADE_RETCODE_DONE
+
+
+class Timeline:
+    # 按時間排序的觀測值，at(t) 返回 t 或之前最後一個值
+    def __init__(self):
+        self.times = []
+        self.values = []
+
+    def add(self, t, value):
+        self.times.append(t)
+        self.values.append(value)
+
+    def at(self, t):
+        i = bisect.bisect_right(self.times, t)
+        return self.values[i - 1] if i else None
+
+    def next_after(self, t):
+        i = bisect.bisect_right(self.times, t)
+        return self.times[i] if i < len(self.times) else float("inf")
+
+
+class ReplaySheetIndex:
+    # 代替 SheetRowIndex，返回虛擬時間當時工作表的內容
+    def __init__(self, timeline, clock):
+        self.timeline = timeline
+        self.clock = clock
+        self.rows = {}
+        self.full_scans = 0
+
+    def read(self, products):
+        snapshot = self.timeline.at(self.clock()) or {}
+        self.rows = {key: entry[0] for key, entry in snapshot.items()}
+        keys = [p.lower() for p in products]
+        return {key: tuple(snapshot[key]) for key in keys if key in snapshot}
+
+    def product_names(self):
+        return sorted(self.rows, key=self.rows.get)
+
+
+class OrderRecorder:
+    # 實現 SignalJournal 的記錄介面，只收集重播時發出的訂單
+    def __init__(self, clock):
+        self.clock = clock
+        self.orders = []
+
+    def record_order(self, request, result, attempts):
+        retcode = result.retcode if result is not None else None
+        self.orders.append((self.clock(), order_key(request["symbol"], request), retcode))
+
+    def record_start(self, *args):
+        pass
+
+    def record_sheet(self, *args):
+        pass
+
+    def record_push(self, *args):
+        pass
+
+    def record_positions(self, *args):
+        pass
+
+    def record_tick(self, *args):
+        pass
+
+    def close(self):
+        pass
+
+
+def order_key(symbol, request):
+    return (symbol, request.get("action"), request.get("type"), round(float(request.get("volume", 0.0)), 2),
+            request.get("position") is not None)
+
+
+def split_segments(records):
+    # 每條 start 記錄代表一次連線 (程式重啟或重新連線)，各段獨立重播
+    segments = []
+    for record in records:
+        if record["k"] == "start":
+            segments.append([record])
+        elif segments:
+            segments[-1].append(record)
+    return segments
+
+
+def replay_segment(records):
+    start = records[0]
+    clock = VirtualClock(start["t"])
+    sheets = Timeline()
+    ticks = {}
+    events = []
+    expected = []
+    initial_positions = None
+    for record in records[1:]:
+        kind = record["k"]
+        if kind == "sheet":
+            sheets.add(record["t"], record["rows"])
+            if record["src"] == "refresh":
+                events.append((record["t"], record.get("auto", False), None))
+        elif kind == "push":
+            events.append((record["t"], record.get("auto", False), record))
+        elif kind == "tick":
+            ticks.setdefault(record["s"], Timeline()).add(record["t"], (record["b"], record["a"]))
+        elif kind == "pos" and initial_positions is None:
+            initial_positions = record["p"]
+        elif kind == "order" and record["rc"] == DONE:
+            expected.append((record["t"], order_key(record["s"], record["req"])))
+
+    def tick_source(symbol):
+        # 報價在同一輪讀取工作表之後才記錄，取下一次讀取工作表之前的最後一個報價
+        timeline = ticks.get(symbol)
+        return timeline.at(sheets.next_after(clock()) - 1e-6) if timeline else None
+
+    BROKER.configure(hedging=start["hedging"], fifo=start["fifo"])
+    BROKER.load_positions(initial_positions or [])
+    BROKER.tick_source = tick_source
+
+    engine = TradeEngine(symbol_map=start["symbols"])
+    engine.clock = engine.position_book.clock = clock
+    engine.now = clock.now
+    # 按記錄時的頻率限制及 0 值確認設定重播；舊日誌沒有這些欄位時使用預設值
+    engine.trade_limiter.interval = start.get("trade_interval", engine.trade_limiter.interval)
+    engine.trade_limiter.capacity = start.get("trade_burst", engine.trade_limiter.capacity)
+    engine.zero_confirm.required = start.get("zero_confirmations", engine.zero_confirm.required)
+    engine.zero_confirm.interval = start.get("zero_interval", engine.zero_confirm.interval)
+    engine.zero_confirm.mode = start.get("zero_mode", engine.zero_confirm.mode)
+    recorder = OrderRecorder(clock)
+    engine.journal = recorder
+    engine.connect_to_mt5_and_fetch_positions()
+    engine.sheet_index = engine.worksheet = ReplaySheetIndex(sheets, clock)
+
+    for t, auto_trade, push in events:
+        # 按虛擬時間執行到期的排隊交易及 0 值驗證，再執行該輪刷新或推送
+        due = engine.next_due()
+        while due is not None and due <= t:
+            clock.t = max(clock.t, due)
+            engine.market.invalidate_ticks()
+            engine.run_due_checks()
+            following = engine.next_due()
+            if following == due:
+                break
+            due = following
+        clock.t = t
+        engine.auto_trade = auto_trade
+        engine.market.invalidate_ticks()
+        if push is None:
+            engine.refresh_data()
+        else:
+            engine.apply_pushed_targets(push["targets"], push["src"])
+
+    replayed = [(t, key) for t, key, retcode in recorder.orders if retcode == DONE]
+    return {
+        "start": start["t"],
+        "end": clock.t,
+        "refreshes": sum(1 for event in events if event[2] is None),
+        "pushes": sum(1 for event in events if event[2] is not None),
+        "expected": expected,
+        "replayed": replayed,
+        "positions": {spec.internal: BROKER.net_position(spec.mt5) for spec in engine.symbols},
+    }
+
+
+def compare_orders(expected, replayed, limit=20):
+    differences = []
+    for i in range(max(len(expected), len(replayed))):
+        left = expected[i] if i < len(expected) else None
+        right = replayed[i] if i < len(replayed) else None
+        if left is None or right is None or left[1] != right[1]:
+            differences.append((i, left, right))
+            if len(differences) >= limit:
+                break
+    return differences
+
+
+def describe(order):
+    if order is None:
+        return "(無)"
+    t, (symbol, action, order_type, volume, closing) = order
+    side = "買入" if order_type == BROKER.ORDER_TYPE_BUY else "賣出"
+    if action == BROKER.TRADE_ACTION_CLOSE_BY:
+        side = "對沖平倉"
+    elif closing:
+        side = f"平倉{side}"
+    return f"{datetime.fromtimestamp(t).strftime('%Y-%m-%d %H:%M:%S')} {symbol} {side} {volume:.2f} 手"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以模擬券商重播信號日誌，重現交易決策並與記錄比較")
+    parser.add_argument("journal", help="rtrade_daemon.py --journal 產生的日誌檔案")
+    parser.add_argument("--log-level", default="ERROR", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="重播時引擎的日誌級別")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level), format="%(message)s")
+
+    started = time.perf_counter()
+    segments = split_segments(read_journal(args.journal))
+    divergent = 0
+    virtual_seconds = 0.0
+    for segment in segments:
+        result = replay_segment(segment)
+        virtual_seconds += result["end"] - result["start"]
+        differences = compare_orders(result["expected"], result["replayed"])
+        print(f"區段 {datetime.fromtimestamp(result['start']).strftime('%Y-%m-%d %H:%M:%S')}: "
+              f"刷新 {result['refreshes']} 輪，推送 {result['pushes']} 次，記錄成交 {len(result['expected'])} 張，重播成交 {len(result['replayed'])} 張")
+        for index, left, right in differences:
+            print(f"  差異 #{index}: 記錄 {describe(left)} | 重播 {describe(right)}")
+        print(f"  重播後淨持倉: {result['positions']}")
+        divergent += bool(differences)
+    elapsed = time.perf_counter() - started
+    speedup = virtual_seconds / elapsed if elapsed else 0.0
+    print(f"共 {len(segments)} 個區段，{divergent} 個有差異，重播 {virtual_seconds:.0f} 秒歷史用時 {elapsed:.2f} 秒 ({speedup:.0f} 倍速)")
+    return 1 if divergent else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
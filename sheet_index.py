@@ -0,0 +1,105 @@
+import time
+import hashlib
+
+
+def column_letter(col):
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+class SheetRowIndex:
+    # 記住每個產品在工作表中的行號，之後只以一次批量請求讀取這些行的產品及手數儲存格
+    # 當快取的行不再是預期產品時才重新下載整張工作表
+    # 上次掃描時不存在的產品記在 absent，之後不會每次都觸發整表下載，
+    # 只在經過 absent_rescan_polls 次讀取或 absent_rescan_interval 秒後才重新掃描，看是否已加入
+    def __init__(self, worksheet, product_col=2, lot_col=3, metrics=None, quota=None,
+                 absent_rescan_polls=30, absent_rescan_interval=60.0, clock=time.monotonic):
+        self.worksheet = worksheet
+        self.metrics = metrics
+        self.quota = quota
+        self.product_col = product_col
+        self.lot_col = lot_col
+        self.absent_rescan_polls = absent_rescan_polls
+        self.absent_rescan_interval = absent_rescan_interval
+        self.clock = clock
+        self.rows = {}
+        self.absent = set()
+        self.polls_since_rescan = 0
+        self.last_rescan = None
+        self.full_scans = 0
+
+    def rescan(self):
+        if self.quota:
+            self.quota.record()
+        started = time.perf_counter()
+        all_data = self.worksheet.get_all_values()
+        if self.metrics:
+            self.metrics.observe("get_all_values", time.perf_counter() - started)
+        self.full_scans += 1
+        self.polls_since_rescan = 0
+        self.last_rescan = self.clock()
+        self.rows = {}
+        entries = {}
+        for row_idx, row in enumerate(all_data):
+            if len(row) >= self.lot_col:
+                product = str(row[self.product_col - 1]).strip()
+                key = product.lower()
+                if key and key not in self.rows:
+                    self.rows[key] = row_idx + 1
+                    entries[key] = (row_idx + 1, product, str(row[self.lot_col - 1]).strip())
+        return entries
+
+    def cell_range(self, row_number):
+        return f"{column_letter(self.product_col)}{row_number}:{column_letter(self.lot_col)}{row_number}"
+
+    def read(self, products):
+        # 返回 {產品: (行號, 產品名稱, 手數字串)}，找不到的產品不會出現在結果中
+        keys = [p.lower() for p in products]
+        self.polls_since_rescan += 1
+        unknown = [k for k in keys if k not in self.rows]
+        if self.last_rescan is None or any(k not in self.absent for k in unknown) or \
+                (unknown and self.absent_rescan_due()):
+            return self.rescan_for(keys)
+
+        # 只讀取已知行，上次掃描時不存在的產品直接視為缺失
+        keys = [k for k in keys if k in self.rows]
+        if not keys:
+            return {}
+        ranges = [self.cell_range(self.rows[k]) for k in keys]
+        if self.quota:
+            self.quota.record()
+        started = time.perf_counter()
+        results = self.worksheet.batch_get(ranges)
+        if self.metrics:
+            self.metrics.observe("batch_get", time.perf_counter() - started)
+        entries = {}
+        for key, value_range in zip(keys, results):
+            row = value_range[0] if value_range else []
+            product = str(row[0]).strip() if len(row) >= 1 else ""
+            if product.lower() != key:
+                # 行已移動，重新建立索引
+                return self.rescan_for([p.lower() for p in products])
+            lot_str = str(row[self.lot_col - self.product_col]).strip() if len(row) > self.lot_col - self.product_col else ""
+            entries[key] = (self.rows[key], product, lot_str)
+        return entries
+
+    def absent_rescan_due(self):
+        return self.polls_since_rescan >= self.absent_rescan_polls or \
+            self.clock() - self.last_rescan >= self.absent_rescan_interval
+
+    def rescan_for(self, keys):
+        entries = self.rescan()
+        self.absent = (self.absent | set(keys)) - set(self.rows)
+        return {k: entries[k] for k in keys if k in entries}
+
+    def product_names(self):
+        return sorted(self.rows, key=self.rows.get)
+
+
+def snapshot_fingerprint(entries):
+    # 以相關儲存格內容計算雜湊，用於判斷工作表自上次讀取後是否有變化
+    payload = "\x1f".join(f"{key}\x1e{entries[key][0]}\x1e{entries[key][2]}" for key in sorted(entries))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
@@ -0,0 +1,118 @@
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+import gspread
+import requests
+from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import AuthorizedSession, Request
+from requests.adapters import HTTPAdapter
+
+# 與 gspread 預設相同的權限範圍 (以標題開啟試算表需要 Drive 查詢)
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+
+class SheetsClient:
+    # 可重用的已授權 Sheets 連線，取代 oauth2client 及全局 socket 逾時：
+    # 所有請求共用一個保持連線的 HTTP 連線池，逾時按請求設定；背景線程在令牌到期前 refresh_margin 秒主動刷新，
+    # 讀取時不會遇到過期令牌引起的額外往返；開啟工作表的請求只在首次開啟時發送，重新連線時重用
+    def __init__(self, key_file, timeout=(5.0, 30.0), refresh_margin=300.0, pool_size=4):
+        self.credentials = Credentials.from_service_account_file(key_file, scopes=SCOPES)
+        self.session = AuthorizedSession(self.credentials)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        # 令牌端點使用獨立的普通連線，避免刷新請求本身再經過需要令牌的 AuthorizedSession
+        self.token_session = requests.Session()
+        self.client = gspread.Client(self.credentials, session=self.session)
+        self.client.set_timeout(timeout)
+        self.refresh_margin = refresh_margin
+        self.refresh_lock = threading.Lock()
+        self.worksheets = {}
+        self.worksheet_titles = {}
+        self.refresh_count = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def service_account_email(self):
+        return self.credentials.service_account_email
+
+    def seconds_to_expiry(self):
+        # google-auth 的 expiry 為不含時區的 UTC 時間；尚未取得令牌時返回 0
+        if not self.credentials.token or not self.credentials.expiry:
+            return 0.0
+        return (self.credentials.expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+
+    def refresh_token(self):
+        with self.refresh_lock:
+            started = time.perf_counter()
+            self.credentials.refresh(Request(self.token_session))
+            self.refresh_count += 1
+            return time.perf_counter() - started
+
+    def ensure_fresh(self):
+        if self.seconds_to_expiry() <= self.refresh_margin:
+            return self.refresh_token()
+        return None
+
+    def run_refresher(self):
+        while True:
+            try:
+                elapsed = self.ensure_fresh()
+                if elapsed is not None:
+                    logging.debug(f"信息: 已提前刷新 Google 存取令牌，耗時 {elapsed * 1000:.0f} 毫秒，"
+                                  f"{self.seconds_to_expiry():.0f} 秒後到期")
+                wait = max(1.0, self.seconds_to_expiry() - self.refresh_margin)
+            except Exception as e:
+                # 刷新失敗時令牌通常仍然有效，稍後重試
+                logging.warning(f"警告: 刷新 Google 存取令牌失敗: {str(e)}")
+                wait = 30.0
+            if self.stop_event.wait(wait):
+                return
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_refresher, name="rtrade-sheets-token", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(1.0)
+            self.thread = None
+
+    def open_worksheet(self, spreadsheet_title, worksheet_title):
+        # 首次開啟需要 3 個請求：以標題在 Drive 查找試算表、gspread 建立 Spreadsheet 時讀取試算表屬性，
+        # 以及 worksheets() 一次取得所有分頁；之後直接返回快取的 Worksheet，不再發送請求
+        key = (spreadsheet_title, worksheet_title)
+        worksheet = self.worksheets.get(key)
+        if worksheet is not None:
+            return worksheet
+        self.ensure_fresh()
+        spreadsheet = self.client.open(spreadsheet_title)
+        worksheets = spreadsheet.worksheets()
+        self.worksheet_titles[spreadsheet_title] = [sheet.title for sheet in worksheets]
+        for sheet in worksheets:
+            if sheet.title == worksheet_title:
+                worksheet = sheet
+                break
+        else:
+            raise gspread.WorksheetNotFound(worksheet_title)
+        self.worksheets[key] = worksheet
+        return worksheet
+
+    def reset(self):
+        # 關閉連線池中的所有連線 (之後的請求會建立新連線)，並確保令牌有效
+        self.session.close()
+        self.token_session.close()
+        self.ensure_fresh()
+
+    def close(self):
+        self.stop()
+        self.session.close()
+        self.token_session.close()
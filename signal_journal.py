@@ -0,0 +1,77 @@
+import json
+import time
+import threading
+
+# 記錄類型：start (品種、帳戶、頻率限制及 0 值確認設定)、sheet (工作表讀取)、push (推送信號源的目標)、pos (持倉)、tick (報價)、order (下單結果)
+# 每行一個緊湊 JSON，只追加不修改；工作表內容未變時只記錄 same 標記
+
+
+class SignalJournal:
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.last_sheet = None
+        self.records = 0
+
+    def write(self, kind, **fields):
+        fields["k"] = kind
+        fields["t"] = round(self.clock(), 3)
+        line = json.dumps(fields, ensure_ascii=False, separators=(",", ":"))
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+            self.records += 1
+
+    def record_start(self, symbols, hedging, fifo, limiter, zero_confirm):
+        self.last_sheet = None
+        self.write("start", symbols={spec.google: spec.mt5 for spec in symbols}, hedging=hedging, fifo=fifo,
+                   trade_interval=limiter.interval, trade_burst=limiter.capacity,
+                   zero_confirmations=zero_confirm.required, zero_interval=zero_confirm.interval,
+                   zero_mode=zero_confirm.mode)
+
+    def record_sheet(self, source, entries, auto_trade):
+        rows = {key: list(entry) for key, entry in entries.items()}
+        if rows == self.last_sheet:
+            self.write("sheet", src=source, auto=auto_trade, same=1)
+        else:
+            self.last_sheet = rows
+            self.write("sheet", src=source, auto=auto_trade, rows=rows)
+
+    def record_push(self, source, targets, auto_trade):
+        self.write("push", src=source, auto=auto_trade, targets=targets)
+
+    def record_positions(self, positions):
+        self.write("pos", p=[[p.ticket, p.symbol, p.type, p.volume, p.price_open, getattr(p, "time_msc", 0)]
+                             for p in positions or ()])
+
+    def record_tick(self, symbol, tick):
+        if tick:
+            self.write("tick", s=symbol, b=tick.bid, a=tick.ask)
+
+    def record_order(self, request, result, attempts):
+        fields = {key: request[key] for key in ("action", "type", "volume", "position", "position_by", "price") if key in request}
+        self.write("order", s=request["symbol"], req=fields, rc=result.retcode if result is not None else None,
+                   n=attempts)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_journal(path):
+    # 逐行讀取並還原 same 標記的工作表內容；最後一行寫了一半時忽略
+    last_rows = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record["k"] == "sheet":
+                if record.get("same"):
+                    record["rows"] = last_rows
+                else:
+                    last_rows = record["rows"]
+            yield record
@@ -0,0 +1,180 @@
+import os
+import json
+import logging
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 推送式信號源：收到目標手數後立即呼叫 submit(targets, 來源名稱)，targets 為 {產品: 手數}
+# 工作表輪詢仍由刷新流程負責，與這些信號源並存，同一產品以最新變化為準
+
+
+def parse_targets(payload):
+    # 接受 {"xauusd": 1.5} 或 {"targets": {"xauusd": 1.5}}
+    data = json.loads(payload)
+    if isinstance(data, dict) and isinstance(data.get("targets"), dict):
+        data = data["targets"]
+    if not isinstance(data, dict):
+        raise ValueError("目標必須是 JSON 物件")
+    return data
+
+
+class SignalSource:
+    name = "信號源"
+
+    def start(self, submit):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+
+class WebhookSource(SignalSource):
+    # 上游系統以 POST 把 JSON 目標送到本機端口；設定 token 時要求 Authorization: Bearer <token>
+    def __init__(self, port, host="127.0.0.1", path="/targets", token=None):
+        self.name = f"Webhook:{port}"
+        self.host = host
+        self.port = port
+        self.path = path
+        self.token = token
+        self.server = None
+
+    def start(self, submit):
+        source = self
+
+        class WebhookHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != source.path:
+                    self.reply(404, "not found")
+                    return
+                if source.token and self.headers.get("Authorization") != f"Bearer {source.token}":
+                    self.reply(401, "unauthorized")
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    targets = parse_targets(self.rfile.read(length).decode("utf-8"))
+                except ValueError as e:
+                    self.reply(400, str(e))
+                    return
+                submit(targets, source.name)
+                self.reply(202, "accepted")
+
+            def reply(self, code, text):
+                body = text.encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), WebhookHandler)
+        threading.Thread(target=self.server.serve_forever, name="rtrade-webhook", daemon=True).start()
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class FileWatchSource(SignalSource):
+    # 監視本機 JSON 檔案，修改時間或大小變化即讀取；標準庫沒有 inotify，以 50 毫秒 stat 輪詢代替
+    def __init__(self, path, interval=0.05):
+        self.name = f"檔案:{os.path.basename(path)}"
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def run(self, submit):
+        last = self.signature()
+        while not self.stop_event.wait(self.interval):
+            current = self.signature()
+            if current is None or current == last:
+                continue
+            last = current
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    targets = parse_targets(f.read())
+            except (OSError, ValueError) as e:
+                # 上游可能仍在寫入，下一次變化時再讀取
+                logging.warning(f"警告: 無法讀取信號檔案 {self.path}: {str(e)}")
+                continue
+            submit(targets, self.name)
+
+    def start(self, submit):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, args=(submit,), name="rtrade-file-source", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(1.0)
+
+
+class LineServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SocketSource(SignalSource):
+    # 本機 TCP 端口，每行一個 JSON 目標物件，連線可保持開啟持續推送
+    def __init__(self, port, host="127.0.0.1"):
+        self.name = f"Socket:{port}"
+        self.host = host
+        self.port = port
+        self.server = None
+
+    def start(self, submit):
+        source = self
+
+        class LineHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        targets = parse_targets(line.decode("utf-8"))
+                    except ValueError as e:
+                        self.wfile.write(f"error {str(e)}\n".encode("utf-8"))
+                        continue
+                    submit(targets, source.name)
+                    self.wfile.write(b"ok\n")
+
+        self.server = LineServer((self.host, self.port), LineHandler)
+        threading.Thread(target=self.server.serve_forever, name="rtrade-socket-source", daemon=True).start()
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def build_sources(config):
+    # config: {"webhook": {"port": 8765, "token": "..."}, "file": {"path": "targets.json"}, "socket": {"port": 8766}}
+    sources = []
+    if config.get("webhook"):
+        sources.append(WebhookSource(**config["webhook"]))
+    if config.get("file"):
+        sources.append(FileWatchSource(**config["file"]))
+    if config.get("socket"):
+        sources.append(SocketSource(**config["socket"]))
+    return sources
+
+
+def load_source_config(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
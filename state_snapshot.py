@@ -0,0 +1,41 @@
+import os
+import json
+import time
+
+# 引擎狀態的本機快照，重啟後恢復最近一次非 0 手數、0 值確認進度、目標手數及交易頻率限制
+# 每次變化時整份重寫：先寫入暫存檔並 fsync，再以 os.replace 原子替換，不會留下寫了一半的快照
+STATE_VERSION = 1
+
+
+class StateSnapshot:
+    # max_age: 超過此秒數的快照只恢復非 0 手數及工作表儲存格，不恢復目標及 0 值確認進度
+    def __init__(self, path, max_age=600.0):
+        self.path = path
+        self.max_age = max_age
+        self.last = None
+
+    def load(self):
+        # 檔案不存在時返回 None，內容損壞或版本不符時拋出 ValueError
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        if not isinstance(data, dict) or data.get("version") != STATE_VERSION:
+            raise ValueError(f"版本不符 ({data.get('version') if isinstance(data, dict) else None}，需要 {STATE_VERSION})")
+        self.last = {key: value for key, value in data.items() if key not in ("version", "saved_at")}
+        return data
+
+    def save(self, state):
+        # 內容與上次相同時不寫入，返回是否已寫入
+        if state == self.last:
+            return False
+        data = dict(state, version=STATE_VERSION, saved_at=time.time())
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self.last = state
+        return True
@@ -0,0 +1,56 @@
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+from datetime import datetime
+
+# log_message 可附加的結構化欄位
+STRUCTURED_FIELDS = ("symbol", "lots", "retcode", "latency_ms", "attempts")
+# 第三方套件的日誌 (每個 Sheets 請求都有 DEBUG 記錄) 最低只記錄 WARNING
+THIRD_PARTY_LOGGERS = ("urllib3", "google", "google_auth_httplib2", "gspread", "requests")
+
+
+class JsonLinesFormatter(logging.Formatter):
+    # 每條記錄輸出為一行 JSON，方便程式解析
+    def format(self, record):
+        payload = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update({key: value for key, value in fields.items() if key in STRUCTURED_FIELDS})
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def setup_logging(path="rtrade.log", level=logging.INFO, max_bytes=10 * 1024 * 1024,
+                  backup_count=10, when=None, console=True):
+    # 熱路徑只把記錄放入佇列，由背景線程寫入檔案；when 設定時按時間輪替，否則按大小輪替
+    if when:
+        file_handler = logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backup_count, encoding="utf-8")
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    file_handler.setFormatter(JsonLinesFormatter())
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter("%(message)s"))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+    for name in THIRD_PARTY_LOGGERS:
+        logging.getLogger(name).setLevel(max(level, logging.WARNING))
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,27 @@
+import os
+import json
+from collections import namedtuple
+
+# google: 工作表中的產品名稱 (小寫)，mt5: 券商交易品種 (含後綴)，internal: 內部統一使用的鍵名
+SymbolSpec = namedtuple("SymbolSpec", ["google", "mt5", "internal"])
+
+DEFAULT_SYMBOL_MAP = {"xauusd": "XAUUSD.ECN"}
+
+
+def internal_name(mt5_symbol):
+    return mt5_symbol.split(".")[0].upper()
+
+
+def build_symbol_specs(mapping):
+    specs = []
+    for google_symbol, mt5_symbol in mapping.items():
+        specs.append(SymbolSpec(google_symbol.strip().lower(), mt5_symbol.strip(), internal_name(mt5_symbol.strip())))
+    return specs
+
+
+def load_symbol_map(path=None):
+    # 讀取 {工作表產品: MT5 品種} 對照表，檔案不存在時使用預設的 XAUUSD 對照
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return build_symbol_specs(json.load(f))
+    return build_symbol_specs(DEFAULT_SYMBOL_MAP)
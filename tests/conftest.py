@@ -0,0 +1,15 @@
+import os
+import sys
+import pytest
+
+# 測試使用 bench 的模擬 MT5 及工作表，必須在匯入 rtrade_engine 之前安裝
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench.fake_mt5 import install
+
+FAKE_MT5 = install()
+
+
+@pytest.fixture
+def fake_mt5():
+    FAKE_MT5.configure()
+    return FAKE_MT5
@@ -0,0 +1,55 @@
+import numpy
+from position_book import POSITION_DTYPE
+from execution_planner import PlannedOrder, plan_orders
+
+BUY = 0
+SELL = 1
+
+
+def positions(*rows):
+    # rows: (ticket, type, volume)，按開倉時間順序
+    return numpy.array([(ticket, "XAUUSD", kind, volume, 2000.0, ticket) for ticket, kind, volume in rows],
+                       dtype=POSITION_DTYPE)
+
+
+def test_already_at_target():
+    assert plan_orders(positions((1, SELL, 1.0)), -1.0) == []
+
+
+def test_opens_difference_from_flat():
+    assert plan_orders(positions(), -0.5) == [PlannedOrder("open", -1, 0.5, None, None)]
+
+
+def test_netting_account_sends_one_order():
+    orders = plan_orders(positions((1, BUY, 0.3), (2, SELL, 1.0)), 0.2, hedging=False)
+    assert orders == [PlannedOrder("open", 1, 0.9, None, None)]
+
+
+def test_closes_largest_ticket_first():
+    orders = plan_orders(positions((1, SELL, 0.2), (2, SELL, 1.0)), -0.2)
+    assert orders == [PlannedOrder("close", 1, 1.0, 2, None)]
+
+
+def test_fifo_closes_oldest_ticket_first():
+    orders = plan_orders(positions((1, SELL, 0.2), (2, SELL, 1.0)), -0.2, fifo=True)
+    assert orders == [PlannedOrder("close", 1, 0.2, 1, None), PlannedOrder("close", 1, 0.8, 2, None)]
+
+
+def test_close_by_removes_hedge():
+    orders = plan_orders(positions((1, BUY, 0.5), (2, SELL, 0.5)), 0.0)
+    assert orders == [PlannedOrder("close_by", 1, 0.5, 1, 2)]
+
+
+def test_one_short_closes_by_several_longs():
+    orders = plan_orders(positions((1, BUY, 0.3), (2, BUY, 0.3), (3, SELL, 1.0)), -0.4)
+    assert orders == [PlannedOrder("close_by", 1, 0.3, 1, 3), PlannedOrder("close_by", 1, 0.3, 2, 3)]
+
+
+def test_one_long_closes_by_several_shorts():
+    orders = plan_orders(positions((1, BUY, 1.0), (2, SELL, 0.3), (3, SELL, 0.3)), 0.4)
+    assert orders == [PlannedOrder("close_by", 1, 0.3, 1, 2), PlannedOrder("close_by", 1, 0.3, 1, 3)]
+
+
+def test_hedge_flipped_keeps_short_ticket():
+    orders = plan_orders(positions((1, BUY, 0.5), (2, SELL, 0.2)), -1.0)
+    assert orders == [PlannedOrder("close", -1, 0.5, 1, None), PlannedOrder("open", -1, 0.8, None, None)]
@@ -0,0 +1,74 @@
+import threading
+import pytest
+from position_board import PositionBoard
+
+KEYS = ["xauusd", "eurusd", "gbpusd"]
+
+
+@pytest.fixture
+def boards():
+    owner = PositionBoard(KEYS)
+    worker = PositionBoard(KEYS, owner.name, create=False)
+    yield owner, worker
+    worker.close()
+    owner.close()
+
+
+def test_targets_and_nets_round_trip(boards):
+    owner, worker = boards
+    assert worker.read_targets() == (0, 0.0, {})
+    assert owner.publish_targets({"xauusd": 1.5, "unknown": 9.0}, 123.0) == 1
+    assert worker.read_targets() == (1, 123.0, {"xauusd": 1.5})
+    worker.publish_nets({"xauusd": -1.5}, 1, 2, 0, 1, 0.001, 0.02)
+    assert owner.read_nets() == (1, {"xauusd": -1.5, "eurusd": 0.0, "gbpusd": 0.0})
+    assert owner.read_report() == (1, 2, 0, 1, 0.001, 0.02)
+
+
+def test_reader_waits_for_writer_to_finish(boards):
+    owner, worker = boards
+    owner.publish_targets({"xauusd": 1.0}, 1.0)
+    # 寫入一半時 (序號為奇數) 讀取方必須等待，不能讀到新舊混合的目標
+    owner.begin("target_seq")
+    owner.rows["target"][0] = 2.0
+    result = []
+    reader = threading.Thread(target=lambda: result.append(worker.read_targets()))
+    reader.start()
+    reader.join(0.2)
+    assert reader.is_alive() and not result
+    owner.rows["target"][1] = 3.0
+    owner.header["batch"] += 1
+    owner.end("target_seq")
+    reader.join(2.0)
+    assert result == [(2, 1.0, {"xauusd": 2.0, "eurusd": 3.0})]
+
+
+def test_concurrent_reads_are_consistent(boards):
+    owner, worker = boards
+    stop = threading.Event()
+
+    def write():
+        lot = 0.0
+        while not stop.is_set():
+            lot += 1.0
+            owner.publish_targets({key: lot for key in KEYS}, lot)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        for _ in range(2000):
+            batch, sent_at, targets = worker.read_targets()
+            if batch:
+                assert set(targets.values()) == {sent_at}
+    finally:
+        stop.set()
+        writer.join()
+
+
+def test_stop_request_wakes_worker():
+    wake = threading.Event()
+    board = PositionBoard(KEYS, wake=wake)
+    try:
+        board.request_stop()
+        assert wake.is_set() and board.field("stop") == 1
+    finally:
+        board.close()
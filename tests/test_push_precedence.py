@@ -0,0 +1,66 @@
+import pytest
+from bench.fake_sheets import FakeWorksheet, make_rows
+from bench.virtual_clock import VirtualClock
+from rtrade_engine import TradeEngine
+
+SYMBOLS = {"xauusd": "XAUUSD.ECN", "eurusd": "EURUSD"}
+
+
+@pytest.fixture
+def setup(fake_mt5):
+    clock = VirtualClock(1_700_000_000.0)
+    worksheet = FakeWorksheet(make_rows(20, list(SYMBOLS), {"xauusd": "1", "eurusd": "1"}))
+    engine = TradeEngine(symbol_map=SYMBOLS)
+    engine.clock = engine.position_book.clock = clock
+    engine.now = clock.now
+    engine.trade_limiter.interval = 0.0
+    assert engine.connect_to_mt5_and_fetch_positions()
+    engine.attach_worksheet(worksheet)
+    engine.auto_trade = True
+    yield engine, worksheet, fake_mt5
+    engine.shutdown()
+
+
+def test_push_holds_while_sheet_cell_unchanged(setup):
+    engine, worksheet, fake = setup
+    engine.refresh_data()
+    assert fake.net_position("XAUUSD.ECN") == -1.0
+    engine.apply_pushed_targets({"xauusd": "0.5"}, "webhook")
+    assert fake.net_position("XAUUSD.ECN") == -0.5
+    # 其他產品變化觸發完整刷新，xauusd 儲存格未變，推送值仍然有效
+    worksheet.set_lot("eurusd", "2")
+    engine.refresh_data()
+    assert fake.net_position("XAUUSD.ECN") == -0.5
+    assert fake.net_position("EURUSD") == -2.0
+
+
+def test_sheet_change_overrides_push(setup):
+    engine, worksheet, fake = setup
+    engine.refresh_data()
+    engine.apply_pushed_targets({"xauusd": 0.5}, "webhook")
+    worksheet.set_lot("xauusd", "2")
+    engine.refresh_data()
+    assert fake.net_position("XAUUSD.ECN") == -2.0
+    assert "XAUUSD" not in engine.pushed_lots
+
+
+def test_push_before_first_sheet_read_uses_read_as_baseline(setup):
+    engine, worksheet, fake = setup
+    engine.apply_pushed_targets({"xauusd": 0.5}, "socket")
+    assert fake.net_position("XAUUSD.ECN") == -0.5
+    engine.refresh_data()
+    assert fake.net_position("XAUUSD.ECN") == -0.5
+    worksheet.set_lot("xauusd", "3")
+    engine.refresh_data()
+    assert fake.net_position("XAUUSD.ECN") == -3.0
+
+
+def test_push_cancels_pending_zero_confirmation(setup):
+    engine, worksheet, fake = setup
+    engine.refresh_data()
+    worksheet.set_lot("xauusd", "")
+    engine.refresh_data()
+    assert engine.zero_confirm.is_pending("XAUUSD")
+    engine.apply_pushed_targets({"xauusd": 1.5}, "file")
+    assert not engine.zero_confirm.is_pending("XAUUSD")
+    assert fake.net_position("XAUUSD.ECN") == -1.5
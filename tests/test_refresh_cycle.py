@@ -0,0 +1,50 @@
+import pytest
+from bench.fake_sheets import FakeWorksheet, make_rows
+from bench.virtual_clock import VirtualClock
+from poll_scheduler import CHANGED, FAILED, UNCHANGED
+from rtrade_engine import TradeEngine
+
+SYMBOLS = {"xauusd": "XAUUSD.ECN"}
+
+
+@pytest.fixture
+def setup(fake_mt5):
+    clock = VirtualClock(1_700_000_000.0)
+    worksheet = FakeWorksheet(make_rows(20, list(SYMBOLS), {"xauusd": "1"}))
+    engine = TradeEngine(symbol_map=SYMBOLS)
+    engine.clock = engine.position_book.clock = clock
+    engine.now = clock.now
+    engine.trade_limiter.interval = 0.0
+    assert engine.connect_to_mt5_and_fetch_positions()
+    engine.attach_worksheet(worksheet)
+    engine.auto_trade = True
+    yield engine, worksheet, fake_mt5
+    engine.shutdown()
+
+
+def test_unchanged_sheet_skips_cycle(setup):
+    engine, worksheet, fake = setup
+    assert engine.refresh_data() == CHANGED
+    assert engine.refresh_data() == UNCHANGED
+    assert engine.metrics.snapshot()[1]["skipped_cycles"] == 1
+
+
+def test_failed_cycle_is_retried_on_next_poll(setup, monkeypatch):
+    engine, worksheet, fake = setup
+    engine.refresh_data()
+    worksheet.set_lot("xauusd", "2")
+    positions_get = fake.positions_get
+    calls = []
+
+    def fail_once(*args, **kwargs):
+        if not calls:
+            calls.append(1)
+            raise RuntimeError("terminal busy")
+        return positions_get(*args, **kwargs)
+
+    monkeypatch.setattr(fake, "positions_get", fail_once)
+    assert engine.refresh_data() == FAILED
+    # 失敗的一輪不能記下新指紋，否則之後的輪詢都會被當作未變化而跳過
+    assert engine.refresh_data() == CHANGED
+    assert engine.google_positions == {"XAUUSD": 2.0}
+    assert fake.net_position("XAUUSD.ECN") == -2.0
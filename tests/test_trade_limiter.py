@@ -0,0 +1,60 @@
+import pytest
+from bench.virtual_clock import VirtualClock
+from trade_limiter import TokenBucket, TradeLimiter
+
+
+def test_bucket_allows_burst_then_refills():
+    bucket = TokenBucket(2, 10.0, 0.0)
+    assert bucket.take(0.0) and bucket.take(0.0)
+    assert not bucket.take(0.0)
+    assert bucket.ready_at(0.0) == 10.0
+    assert bucket.take(10.0)
+    assert not bucket.take(15.0)
+    assert bucket.ready_at(15.0) == pytest.approx(20.0)
+
+
+def test_bucket_without_interval_is_unlimited():
+    bucket = TokenBucket(1, 0.0, 0.0)
+    assert all(bucket.take(0.0) for _ in range(5))
+
+
+def test_bucket_accepts_accumulated_rounding():
+    bucket = TokenBucket(1, 0.1, 0.0)
+    bucket.take(0.0)
+    now = 0.0
+    for _ in range(10):
+        now += 0.01
+        bucket.refill(now)
+    assert bucket.take(now)
+
+
+def test_limiter_is_per_symbol():
+    limiter = TradeLimiter(capacity=1, interval=10.0, clock=VirtualClock(0.0))
+    assert limiter.acquire("xauusd")
+    assert not limiter.acquire("xauusd")
+    assert limiter.acquire("eurusd")
+
+
+def test_deferred_target_is_replaced_and_becomes_due():
+    clock = VirtualClock(0.0)
+    limiter = TradeLimiter(capacity=1, interval=10.0, clock=clock)
+    limiter.acquire("xauusd")
+    assert limiter.defer("xauusd", -1.0) == (10.0, False)
+    clock.t = 4.0
+    assert limiter.defer("xauusd", -2.0) == (6.0, True)
+    assert limiter.pending == {"xauusd": -2.0}
+    assert limiter.due() == [] and limiter.next_due() == 10.0
+    clock.t = 10.0
+    assert limiter.due() == ["xauusd"]
+    assert limiter.acquire("xauusd")
+    assert limiter.pending == {}
+
+
+def test_restore_keeps_tokens_when_settings_match():
+    clock = VirtualClock(0.0)
+    limiter = TradeLimiter(capacity=2, interval=30.0, clock=clock)
+    limiter.acquire("xauusd")
+    restored = TradeLimiter(capacity=2, interval=30.0, clock=clock)
+    restored.restore(limiter.export(0.0), 0.0)
+    assert restored.acquire("xauusd")
+    assert not restored.acquire("xauusd")
@@ -0,0 +1,27 @@
+import time
+import numpy
+from position_book import POSITION_DTYPE
+from trade_store import TradeStore, day_key
+
+
+def test_records_are_written_in_background_and_read_back(tmp_path):
+    store = TradeStore(str(tmp_path))
+    now = time.time()
+    store.append_deal(now, "XAUUSD.ECN", "open", -1, 0.5, 2000.0, 7, 10009)
+    store.append_targets(now, {"XAUUSD.ECN": 1.5})
+    deals = store.open_day("deals", day_key(now))
+    assert deals["symbol"].tolist() == [b"XAUUSD.ECN"] and deals["volume"].tolist() == [0.5]
+    assert store.open_day("targets", day_key(now))["lots"].tolist() == [1.5]
+    store.close()
+
+
+def test_non_ascii_symbols_are_replaced_in_every_kind(tmp_path):
+    store = TradeStore(str(tmp_path))
+    now = time.time()
+    positions = numpy.array([(1, "黃金.ECN", 1, 0.5, 2000.0, 0)], dtype=POSITION_DTYPE)
+    store.append_positions(now, positions)
+    store.append_deal(now, "黃金.ECN", "open", -1, 0.5, 2000.0, 1, 10009)
+    store.append_targets(now, {"黃金.ECN": 0.5})
+    for kind in ("positions", "deals", "targets"):
+        assert store.open_day(kind, day_key(now))["symbol"].tolist() == [b"??.ECN"]
+    store.close()
@@ -0,0 +1,54 @@
+from bench.virtual_clock import VirtualClock
+from zero_confirm import ZeroConfirmation, CACHED, CONFIRMED, IGNORED, PENDING
+
+
+def test_confirms_after_required_spaced_observations():
+    clock = VirtualClock(100.0)
+    zero = ZeroConfirmation(required=3, interval=1.0, clock=clock)
+    assert zero.observe("xauusd") == (PENDING, 1, 0.0)
+    clock.t += 1.0
+    assert zero.observe("xauusd") == (PENDING, 2, 1.0)
+    clock.t += 1.0
+    assert zero.observe("xauusd") == (CONFIRMED, 3, 2.0)
+    assert not zero.is_pending("xauusd")
+
+
+def test_observations_within_interval_are_ignored():
+    clock = VirtualClock(100.0)
+    zero = ZeroConfirmation(required=2, interval=1.0, clock=clock)
+    zero.observe("xauusd")
+    clock.t += 0.5
+    assert zero.observe("xauusd")[0] == IGNORED
+    assert zero.states() == {"xauusd": "1/2"}
+    clock.t += 0.5
+    assert zero.observe("xauusd")[0] == CONFIRMED
+
+
+def test_cancel_restarts_count():
+    clock = VirtualClock(100.0)
+    zero = ZeroConfirmation(required=2, interval=1.0, clock=clock)
+    zero.observe("xauusd")
+    assert zero.cancel("xauusd")
+    assert not zero.cancel("xauusd")
+    clock.t += 1.0
+    assert zero.observe("xauusd")[:2] == (PENDING, 1)
+
+
+def test_due_only_in_targeted_mode():
+    clock = VirtualClock(100.0)
+    zero = ZeroConfirmation(interval=2.0, clock=clock)
+    zero.observe("xauusd")
+    assert zero.due() == []
+    assert zero.next_due() == 102.0
+    clock.t = 102.0
+    assert zero.due() == ["xauusd"]
+    zero.mode = CACHED
+    assert zero.due() == [] and zero.next_due() is None
+
+
+def test_export_and_restore_across_clocks():
+    zero = ZeroConfirmation(clock=VirtualClock(100.0))
+    zero.observe("xauusd")
+    restored = ZeroConfirmation(clock=VirtualClock(10.0))
+    restored.restore(zero.export(1000.0), 1090.0)
+    assert restored.pending == {"xauusd": [1, 10.0, 10.0]}
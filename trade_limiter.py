@@ -0,0 +1,89 @@
+import time
+
+# 浮點累加誤差的容差，避免到期時間剛到時因 0.9999999 個令牌而再等一輪
+EPSILON = 1e-9
+
+
+class TokenBucket:
+    # capacity 個令牌，每 interval 秒補充一個；interval 為 0 時不限制
+    def __init__(self, capacity, interval, now):
+        self.capacity = capacity
+        self.interval = interval
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def refill(self, now):
+        if self.interval <= 0:
+            self.tokens = float(self.capacity)
+        else:
+            self.tokens = min(float(self.capacity), self.tokens + (now - self.updated) / self.interval)
+        self.updated = now
+
+    def take(self, now):
+        self.refill(now)
+        if self.tokens >= 1.0 - EPSILON:
+            self.tokens = max(0.0, self.tokens - 1.0)
+            return True
+        return False
+
+    def ready_at(self, now):
+        self.refill(now)
+        if self.tokens >= 1.0 - EPSILON:
+            return now
+        return now + (1.0 - self.tokens) * self.interval
+
+
+class TradeLimiter:
+    # 每個產品一個令牌桶，取代全局 10 秒限制；被限制的產品只記下最新目標 (中間的目標被合併)，
+    # 令牌到位時由 run_due_checks 立即以當時最新的目標執行
+    def __init__(self, capacity=1, interval=10.0, clock=time.monotonic):
+        self.capacity = capacity
+        self.interval = interval
+        self.clock = clock
+        self.buckets = {}
+        self.pending = {}
+
+    def bucket(self, key):
+        bucket = self.buckets.get(key)
+        if bucket is None or bucket.capacity != self.capacity or bucket.interval != self.interval:
+            bucket = self.buckets[key] = TokenBucket(self.capacity, self.interval, self.clock())
+        return bucket
+
+    def acquire(self, key):
+        # 取得令牌時清除排隊中的目標
+        if self.bucket(key).take(self.clock()):
+            self.pending.pop(key, None)
+            return True
+        return False
+
+    def defer(self, key, target):
+        # 返回距離可以執行的秒數；已有排隊目標時以新目標覆蓋
+        replaced = key in self.pending
+        self.pending[key] = target
+        return self.bucket(key).ready_at(self.clock()) - self.clock(), replaced
+
+    def discard(self, key):
+        self.pending.pop(key, None)
+
+    def clear(self):
+        self.pending = {}
+
+    def due(self):
+        now = self.clock()
+        return [key for key in self.pending if self.bucket(key).ready_at(now) <= now]
+
+    def next_due(self):
+        if not self.pending:
+            return None
+        now = self.clock()
+        return min(self.bucket(key).ready_at(now) for key in self.pending)
+
+    def export(self, offset):
+        # 保存每個產品的令牌數及更新時間 (牆上時間)，重啟後延續頻率限制
+        return {key: [bucket.tokens, bucket.updated + offset] for key, bucket in self.buckets.items()}
+
+    def restore(self, buckets, offset):
+        for key, (tokens, updated) in buckets.items():
+            bucket = self.bucket(key)
+            bucket.tokens = min(float(self.capacity), tokens)
+            bucket.updated = updated - offset
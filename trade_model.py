@@ -0,0 +1,84 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from rtrade_engine import TradeEngine
+
+
+class TradeTableModel(QAbstractTableModel):
+    # 按產品保存每行數值，更新時只對數值改變的儲存格發出 dataChanged
+    headers = ["產品", "當前手數(MT5)", "Google淨手數", "目標手數", "交易指令", "0 值確認"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.row_index = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return self.rows[index.row()][index.column()]
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return None
+
+    def flags(self, index):
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+
+    @staticmethod
+    def build_rows(current_positions, google_positions, zero_states=None):
+        # zero_states: {產品: "已觀察次數/所需次數"}，待確認的產品暫不交易
+        zero_states = zero_states or {}
+        if not google_positions and not zero_states:
+            return [(product, f"{current_lot:.2f}", "0.00", "0.00", "無操作", "")
+                    for product, current_lot in current_positions.items()]
+        rows = []
+        for product, google_lot in google_positions.items():
+            current_lot = current_positions.get(product, 0.0)
+            rows.append((product, f"{current_lot:.2f}", f"{google_lot:.2f}", f"{-google_lot:.2f}",
+                         TradeEngine.calculate_trade_instruction(current_lot, google_lot), zero_states.get(product, "")))
+        for product, state in zero_states.items():
+            if product not in google_positions:
+                rows.append((product, f"{current_positions.get(product, 0.0):.2f}", "待確認", "-", "等待 0 值確認", state))
+        return rows
+
+    def update_positions(self, current_positions, google_positions, zero_states=None):
+        # 返回改變的儲存格數目
+        new_rows = self.build_rows(current_positions, google_positions, zero_states)
+        new_products = [row[0] for row in new_rows]
+        changed = 0
+
+        # 移除已不存在的產品
+        for i in range(len(self.rows) - 1, -1, -1):
+            if self.rows[i][0] not in new_products:
+                self.beginRemoveRows(QModelIndex(), i, i)
+                del self.rows[i]
+                self.endRemoveRows()
+                changed += len(self.headers)
+        self.row_index = {row[0]: i for i, row in enumerate(self.rows)}
+
+        for row in new_rows:
+            i = self.row_index.get(row[0])
+            if i is None:
+                position = len(self.rows)
+                self.beginInsertRows(QModelIndex(), position, position)
+                self.rows.append(row)
+                self.endInsertRows()
+                self.row_index[row[0]] = position
+                changed += len(self.headers)
+                continue
+            old = self.rows[i]
+            if old == row:
+                continue
+            self.rows[i] = row
+            columns = [column for column in range(len(row)) if old[column] != row[column]]
+            for column in columns:
+                cell = self.index(i, column)
+                self.dataChanged.emit(cell, cell, [Qt.ItemDataRole.DisplayRole])
+            changed += len(columns)
+        return changed
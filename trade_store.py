@@ -0,0 +1,170 @@
+import os
+import queue
+import logging
+import threading
+from datetime import datetime, timedelta
+import numpy
+
+# 固定寬度記錄，按日期分目錄追加寫入，讀取時以 numpy.memmap 直接映射，不需解析
+# 品種名稱以 ASCII 位元組儲存 (S32) 以減少檔案大小，非 ASCII 字元以 ? 代替
+# 寫入經佇列交由背景線程完成，引擎線程下單前後不做檔案 I/O
+DEAL_DTYPE = numpy.dtype([
+    ("time", "f8"),
+    ("ticket", "u8"),
+    ("symbol", "S32"),
+    ("kind", "i1"),
+    ("side", "i1"),
+    ("volume", "f8"),
+    ("price", "f8"),
+    ("retcode", "i4"),
+])
+
+POSITION_SNAPSHOT_DTYPE = numpy.dtype([
+    ("time", "f8"),
+    ("ticket", "u8"),
+    ("symbol", "S32"),
+    ("type", "i1"),
+    ("volume", "f8"),
+    ("price_open", "f8"),
+    ("time_msc", "i8"),
+])
+
+TARGET_DTYPE = numpy.dtype([
+    ("time", "f8"),
+    ("symbol", "S32"),
+    ("lots", "f8"),
+])
+
+DTYPES = {"deals": DEAL_DTYPE, "positions": POSITION_SNAPSHOT_DTYPE, "targets": TARGET_DTYPE}
+
+# 成交類型：開倉、指定持倉平倉、對沖平倉 (side 為 0，不產生現金流)
+DEAL_KINDS = {"open": 0, "close": 1, "close_by": 2}
+
+
+def day_key(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y%m%d")
+
+
+class TradeStore:
+    def __init__(self, root):
+        self.root = root
+        self.files = {}
+        os.makedirs(root, exist_ok=True)
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.write_loop, name="rtrade-store", daemon=True)
+        self.thread.start()
+
+    def path(self, kind, day):
+        return os.path.join(self.root, day, f"{kind}.bin")
+
+    def append(self, kind, records):
+        if len(records) == 0:
+            return
+        self.queue.put((kind, records))
+
+    def write_loop(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self.write(*item)
+            except OSError as e:
+                logging.error(f"錯誤: 無法寫入交易記錄 {self.root}: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    def write(self, kind, records):
+        # 只在寫入線程中執行
+        day = day_key(float(records["time"][0]))
+        handle = self.files.get(kind)
+        if handle is None or handle[0] != day:
+            # 跨日時關閉舊檔案，寫入新日期的分區
+            if handle is not None:
+                handle[1].close()
+            os.makedirs(os.path.join(self.root, day), exist_ok=True)
+            handle = self.files[kind] = (day, open(self.path(kind, day), "ab"))
+        handle[1].write(records.astype(DTYPES[kind], copy=False).tobytes())
+        handle[1].flush()
+
+    def flush(self):
+        # 等待佇列中的記錄全部寫入
+        self.queue.join()
+
+    def append_deal(self, timestamp, symbol, kind, side, volume, price, ticket, retcode):
+        record = numpy.array([(timestamp, ticket, symbol.encode("ascii", "replace"), DEAL_KINDS[kind], side,
+                               volume, price, retcode)], dtype=DEAL_DTYPE)
+        self.append("deals", record)
+
+    def append_positions(self, timestamp, positions):
+        # positions 為 PositionBook.positions (POSITION_DTYPE)，空持倉不寫入
+        if len(positions) == 0:
+            return
+        records = numpy.empty(len(positions), dtype=POSITION_SNAPSHOT_DTYPE)
+        records["time"] = timestamp
+        for field in ("ticket", "type", "volume", "price_open", "time_msc"):
+            records[field] = positions[field]
+        records["symbol"] = numpy.char.encode(positions["symbol"], "ascii", "replace")
+        self.append("positions", records)
+
+    def append_targets(self, timestamp, targets):
+        records = numpy.array([(timestamp, symbol.encode("ascii", "replace"), lots) for symbol, lots in targets.items()],
+                              dtype=TARGET_DTYPE)
+        self.append("targets", records)
+
+    def open_day(self, kind, day):
+        # 只映射完整的記錄，忽略寫了一半的最後一筆；先等待已排隊的記錄寫入
+        self.flush()
+        dtype = DTYPES[kind]
+        path = self.path(kind, day)
+        if not os.path.exists(path):
+            return numpy.empty(0, dtype=dtype)
+        count = os.path.getsize(path) // dtype.itemsize
+        if count == 0:
+            return numpy.empty(0, dtype=dtype)
+        return numpy.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+    def open_days(self, kind, days, today=None):
+        # 返回最近 N 天 (含今天) 的 [(日期, memmap)]，不複製數據
+        today = today or datetime.now()
+        result = []
+        for offset in range(days - 1, -1, -1):
+            day = (today - timedelta(days=offset)).strftime("%Y%m%d")
+            records = self.open_day(kind, day)
+            if len(records):
+                result.append((day, records))
+        return result
+
+    def load(self, kind, days, today=None):
+        parts = [records for day, records in self.open_days(kind, days, today)]
+        if not parts:
+            return numpy.empty(0, dtype=DTYPES[kind])
+        return parts[0] if len(parts) == 1 else numpy.concatenate(parts)
+
+    def close(self):
+        # 寫完佇列中的記錄後停止寫入線程並關閉檔案
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        for day, f in self.files.values():
+            f.close()
+        self.files = {}
+
+
+def deal_summary(deals):
+    # 按品種統計買入、賣出手數、淨手數及現金流 (價格 × 手數，未乘合約大小)
+    symbols, inverse = numpy.unique(deals["symbol"], return_inverse=True)
+    count = len(symbols)
+    side = deals["side"].astype("f8")
+    volume = deals["volume"]
+    bought = numpy.bincount(inverse, weights=numpy.where(side > 0, volume, 0.0), minlength=count)
+    sold = numpy.bincount(inverse, weights=numpy.where(side < 0, volume, 0.0), minlength=count)
+    cash = numpy.bincount(inverse, weights=-side * volume * deals["price"], minlength=count)
+    return {symbol.decode("ascii"): (float(bought[i]), float(sold[i]), float(bought[i] - sold[i]), float(cash[i]))
+            for i, symbol in enumerate(symbols)}
+
+
+def mark_to_market(deals, prices):
+    # 現金流加上淨持倉按 prices {品種: 價格} 估值，返回每個品種的盈虧 (價格單位 × 手數)
+    return {symbol: cash + net * prices[symbol]
+            for symbol, (bought, sold, net, cash) in deal_summary(deals).items() if symbol in prices}
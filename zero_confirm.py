@@ -0,0 +1,68 @@
+import time
+
+# 觀察結果
+PENDING = "pending"
+CONFIRMED = "confirmed"
+IGNORED = "ignored"
+
+# 確認方式：targeted 到期時以批量讀取只讀待確認產品；cached 不額外請求，只使用正常刷新讀到的結果
+TARGETED = "targeted"
+CACHED = "cached"
+
+
+class ZeroConfirmation:
+    # 每個產品的 0 值確認狀態機：工作表由非 0 變成空值或缺失時進入待確認，
+    # 累計 required 次觀察到 0 (相鄰兩次至少相隔 interval 秒) 後確認，期間讀到非 0 值即取消
+    def __init__(self, required=3, interval=1.0, mode=TARGETED, clock=time.monotonic):
+        self.required = required
+        self.interval = interval
+        self.mode = mode
+        self.clock = clock
+        self.pending = {}
+
+    def observe(self, key):
+        # 返回 (結果, 已觀察次數, 進入待確認後經過的秒數)；距離上次計數不足 interval 秒的觀察不計入，避免同一瞬間的多次讀取
+        now = self.clock()
+        state = self.pending.get(key)
+        if state is None:
+            state = self.pending[key] = [0, float("-inf"), now]
+        if now - state[1] < self.interval:
+            return IGNORED, state[0], now - state[2]
+        state[0] += 1
+        state[1] = now
+        if state[0] >= self.required:
+            del self.pending[key]
+            return CONFIRMED, state[0], now - state[2]
+        return PENDING, state[0], now - state[2]
+
+    def cancel(self, key):
+        return self.pending.pop(key, None) is not None
+
+    def clear(self):
+        self.pending = {}
+
+    def is_pending(self, key):
+        return key in self.pending
+
+    def next_due(self):
+        # 最早一個需要定向讀取的時間；cached 模式或沒有待確認產品時返回 None
+        if self.mode != TARGETED or not self.pending:
+            return None
+        return min(state[1] for state in self.pending.values()) + self.interval
+
+    def due(self):
+        if self.mode != TARGETED:
+            return []
+        now = self.clock()
+        return [key for key, state in self.pending.items() if now - state[1] >= self.interval]
+
+    def export(self, offset):
+        # 單調時鐘不能跨進程保存，加上 offset 轉為牆上時間
+        return {key: [state[0], state[1] + offset, state[2] + offset] for key, state in self.pending.items()}
+
+    def restore(self, states, offset):
+        for key, (count, last, started) in states.items():
+            self.pending[key] = [count, last - offset, started - offset]
+
+    def states(self):
+        return {key: f"{state[0]}/{self.required}" for key, state in self.pending.items()}